@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+BENCH_SEED = 1337
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+RARITIES = ("Common", "Unique", "Rare", "Epic", "Legendary", "Secret")
+VARIANTS = ("Normal", "Shiny", "Mythic", "Shiny Mythic")
+
+def make_pet(rng: random.Random, index: int) -> dict:
+    slug = f"pet-{index:04d}"
+    variants = []
+    for variant in VARIANTS:
+        variant_slug = slug if variant == "Normal" else f"{variant.lower().replace(' ', '-')}-{slug}"
+        variants.append({
+            "slug": variant_slug,
+            "name": f"{variant} Pet {index}",
+            "description": f"A {rng.choice(RARITIES).lower()} pet hatched from egg {index % 40}.",
+            "image": f"/images/pets/{variant_slug}.png",
+            "variant": variant,
+            "value": rng.randint(1, 10_000_000),
+            "owners": rng.randint(0, 250_000),
+            "exists": rng.randint(0, 1_000_000),
+            "stats": {"bubbles": rng.randint(1, 50_000), "coins": rng.randint(1, 50_000), "gems": rng.randint(0, 500)},
+        })
+    pet = dict(variants[0])
+    pet.update({
+        "rarity": rng.choice(RARITIES),
+        "egg": f"egg-{index % 40}",
+        "chance": rng.random() / 100,
+        "tags": rng.sample(["limited", "event", "robux", "season", "secret", "huge"], 2),
+        "allVariants": variants,
+    })
+    return pet
+
+def make_payloads(item_count: int, hatch_count: int) -> dict:
+    rng = random.Random(BENCH_SEED)
+    pets = [make_pet(rng, index) for index in range(item_count)]
+    hatches = [
+        {
+            "id": index,
+            "user": f"player{rng.randint(1, 500_000)}",
+            "pet": rng.choice(pets)["name"],
+            "chance": rng.random() / 1000,
+            "shiny": rng.random() < 0.1,
+            "hatchedAt": 1_700_000_000_000 + index * 1000,
+        }
+        for index in range(hatch_count)
+    ]
+    stats = {
+        "players": rng.randint(10_000, 500_000),
+        "hatches": rng.randint(10**8, 10**9),
+        "pets": item_count,
+        "secrets": rng.randint(100, 10_000),
+    }
+    return {"pets": pets, "by_slug": {v["slug"]: pet for pet in pets for v in pet["allVariants"]}, "hatches": hatches, "stats": stats}
+
+def create_fake_upstream(item_count: int, hatch_count: int, image_bytes: int, latency_ms: float, jitter_ms: float) -> FastAPI:
+    payloads = make_payloads(item_count, hatch_count)
+    image_body = PNG_SIGNATURE + random.Random(BENCH_SEED).randbytes(max(0, image_bytes - len(PNG_SIGNATURE)))
+    rng = random.Random(BENCH_SEED)
+    app = FastAPI()
+
+    async def delay():
+        seconds = (latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    @app.get("/api/items")
+    async def items(request: Request):
+        await delay()
+        page = max(1, int(request.query_params.get("page", "1")))
+        limit = max(1, min(100, int(request.query_params.get("limit", "20"))))
+        start = (page - 1) * limit
+        return JSONResponse({"pets": payloads["pets"][start:start + limit], "total": item_count, "page": page, "limit": limit})
+
+    @app.get("/api/items/{slug}")
+    async def item(slug: str):
+        await delay()
+        pet = payloads["by_slug"].get(slug)
+        if pet is None:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        return JSONResponse({"pet": pet})
+
+    @app.get("/api/hatches")
+    async def hatches():
+        await delay()
+        return JSONResponse({"hatches": payloads["hatches"]})
+
+    @app.get("/api/stats")
+    async def stats():
+        await delay()
+        return JSONResponse(payloads["stats"])
+
+    @app.get("/images/{image_path:path}")
+    async def image(image_path: str):
+        await delay()
+        return Response(image_body, media_type="image/png", headers={"Cache-Control": "public, max-age=3600"})
+
+    return app
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def read_peak_rss_kb(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def reset_peak_rss(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build_scenarios(item_count: int) -> dict:
+    rng = random.Random(BENCH_SEED)
+    slugs = [f"pet-{rng.randrange(item_count):04d}" for _ in range(1000)]
+    return {
+        "index": ["/"],
+        "api_item_html": [f"/api/items/{slug}" for slug in slugs],
+        "api_item_raw": [f"/api/items/{slug}?format=json" for slug in slugs],
+        "api_hatches_html": ["/api/hatches"],
+        "api_stats_raw": ["/api/stats?format=json"],
+        "image": [f"/images/pets/{slug}.png" for slug in slugs],
+    }
+
+async def run_scenario(base_url: str, paths: list[str], concurrency: int, duration: float, warmup: float, headers: dict) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, headers=headers, timeout=30) as client:
+        latencies: list[float] = []
+        statuses: dict[int, int] = {}
+        errors = 0
+        received = 0
+        cursor = 0
+        recording = False
+
+        async def worker(deadline: float):
+            nonlocal errors, received, cursor
+            while time.perf_counter() < deadline:
+                path = paths[cursor % len(paths)]
+                cursor += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                except httpx.HTTPError:
+                    if recording:
+                        errors += 1
+                    continue
+                if recording:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    received += response.num_bytes_downloaded
+
+        if warmup > 0:
+            await asyncio.gather(*(worker(time.perf_counter() + warmup) for _ in range(concurrency)))
+        recording = True
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + duration) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "bytes_received": received,
+    }
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with status {process.returncode} before becoming ready")
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+def stop(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def start_upstream(args, port: int) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "upstream",
+        "--port", str(port),
+        "--items", str(args.items),
+        "--hatches", str(args.hatches),
+        "--image-bytes", str(args.image_bytes),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+    ])
+
+async def run_benchmark(args) -> dict:
+    api_port = free_port()
+    image_port = free_port()
+    proxy_port = free_port()
+    api_url = f"http://127.0.0.1:{api_port}"
+    image_url = f"http://127.0.0.1:{image_port}"
+    proxy_url = f"http://127.0.0.1:{proxy_port}"
+    script = os.path.abspath(__file__)
+
+    api_upstream = start_upstream(args, api_port)
+    image_upstream = start_upstream(args, image_port)
+    with tempfile.TemporaryDirectory(prefix="bench-cache-") as cache_dir:
+        env = dict(os.environ)
+        env.update({
+            "API_BASE_URL": api_url,
+            "IMAGE_BASE_URL": image_url,
+            "CACHE_DIR": cache_dir,
+            "CACHE_WARMER_ENABLED": "0",
+            "UPSTREAM_HTTP2": "0",
+        })
+        env.update(dict(item.split("=", 1) for item in args.env))
+        proxy = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(proxy_port), "--log-level", "warning", "--no-access-log"],
+            cwd=os.path.dirname(script), env=env,
+        )
+        try:
+            await wait_until_ready(f"{api_url}/api/stats", api_upstream)
+            await wait_until_ready(f"{image_url}/api/stats", image_upstream)
+            await wait_until_ready(f"{proxy_url}/", proxy)
+            scenarios = build_scenarios(args.items)
+            selected = args.scenario or list(scenarios)
+            headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+            results = {}
+            peak_rss_kb = read_peak_rss_kb(proxy.pid)
+            for name in selected:
+                per_scenario = reset_peak_rss(proxy.pid)
+                results[name] = await run_scenario(proxy_url, scenarios[name], args.concurrency, args.duration, args.warmup, headers)
+                scenario_rss_kb = read_peak_rss_kb(proxy.pid)
+                results[name]["proxy_peak_rss_kb" if per_scenario else "proxy_cumulative_peak_rss_kb"] = scenario_rss_kb
+                peak_rss_kb = max(filter(None, (peak_rss_kb, scenario_rss_kb)), default=None)
+                print(f"{name}: {results[name]['rps']} req/s, p50 {results[name]['latency_ms']['p50']} ms, p99 {results[name]['latency_ms']['p99']} ms", file=sys.stderr)
+        finally:
+            stop(proxy)
+            stop(api_upstream)
+            stop(image_upstream)
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "items": args.items,
+            "hatches": args.hatches,
+            "image_bytes": args.image_bytes,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "accept_encoding": args.accept_encoding,
+            "env": sorted(args.env),
+        },
+        "scenarios": results,
+        "proxy_peak_rss_kb": peak_rss_kb,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the proxy against a local stand-in for the bgsi.gg upstream.")
+    subcommands = parser.add_subparsers(dest="command")
+
+    upstream_parser = subcommands.add_parser("upstream", help="Run only the fake upstream server.")
+    upstream_parser.add_argument("--port", type=int, default=3100)
+
+    for command_parser in (parser, upstream_parser):
+        command_parser.add_argument("--items", type=int, default=500, help="Number of fake pets served by /api/items.")
+        command_parser.add_argument("--hatches", type=int, default=200, help="Number of entries in /api/hatches.")
+        command_parser.add_argument("--image-bytes", type=int, default=48 * 1024, help="Size of every fake image.")
+        command_parser.add_argument("--latency-ms", type=float, default=20, help="Added upstream latency per request.")
+        command_parser.add_argument("--jitter-ms", type=float, default=5, help="Uniform jitter applied to the upstream latency.")
+
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="Measured seconds per scenario.")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured seconds per scenario before measuring.")
+    parser.add_argument("--scenario", action="append", choices=list(build_scenarios(1)), help="Run only this scenario (repeatable).")
+    parser.add_argument("--accept-encoding", default="gzip, br", help="Accept-Encoding sent by the load generator; empty to disable.")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra environment for the proxy process (repeatable).")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    if args.command == "upstream":
+        app = create_fake_upstream(args.items, args.hatches, args.image_bytes, args.latency_ms, args.jitter_ms)
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+        return
+
+    report = json.dumps(asyncio.run(run_benchmark(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
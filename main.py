@@ -1,12 +1,51 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 import httpx
 import uvicorn
+import asyncio
+import codecs
+import difflib
+import hashlib
 import json
 import html
 import io
+import math
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode
 
-app = FastAPI(title="BGSI.GG API Explorer & Image Proxy")
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 INDEX_HTML = """
 <!DOCTYPE html>
@@ -420,22 +459,2133 @@ INDEX_HTML = """
 </html>
 """
 
-API_BASE_URL = "https://api.bgsi.gg"
-IMAGE_BASE_URL = "https://www.bgsi.gg"
+API_BASE_URL = os.environ.get("API_BASE_URL", "https://api.bgsi.gg").rstrip("/")
+IMAGE_BASE_URL = os.environ.get("IMAGE_BASE_URL", "https://www.bgsi.gg").rstrip("/")
 IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico")
+IMAGE_PASSTHROUGH_HEADERS = ("etag", "cache-control", "last-modified")
+RANGE_PASSTHROUGH_HEADERS = ("content-range", "accept-ranges")
+STREAMING_RENDER_THRESHOLD = int(os.environ.get("STREAMING_RENDER_THRESHOLD", str(512 * 1024)))
+STREAMING_RENDER_CHUNK_SIZE = int(os.environ.get("STREAMING_RENDER_CHUNK_SIZE", str(64 * 1024)))
+RENDERED_PAGE_MAX_ENTRIES = int(os.environ.get("RENDERED_PAGE_MAX_ENTRIES", "1024"))
+RENDERED_PAGE_MAX_BYTES = int(os.environ.get("RENDERED_PAGE_MAX_BYTES", str(32 * 1024 * 1024)))
+RENDERED_PAGE_SHARED_TTL = float(os.environ.get("RENDERED_PAGE_SHARED_TTL", "3600"))
+DELTA_VERSIONS = int(os.environ.get("DELTA_VERSIONS", "8"))
+DELTA_MAX_RESOURCES = int(os.environ.get("DELTA_MAX_RESOURCES", "1024"))
+DELTA_MAX_BODY_BYTES = int(os.environ.get("DELTA_MAX_BODY_BYTES", str(1024 * 1024)))
+DELTA_MAX_BYTES = int(os.environ.get("DELTA_MAX_BYTES", str(32 * 1024 * 1024)))
+DELTA_PATHS = re.compile(r"conversations/[^/]+/messages|trade-ads|hatches")
+DELTA_QUERY_PARAMS = ("page", "limit", "cursor")
+IMAGE_STREAM_CHUNK_SIZE = int(os.environ.get("IMAGE_STREAM_CHUNK_SIZE", str(64 * 1024)))
+IMAGE_STREAM_BUFFER_BYTES = int(os.environ.get("IMAGE_STREAM_BUFFER_BYTES", str(1024 * 1024)))
+IMAGE_STREAM_IDLE_TIMEOUT = float(os.environ.get("IMAGE_STREAM_IDLE_TIMEOUT", "30"))
+
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+IMAGE_CACHE_ENABLED = os.environ.get("IMAGE_CACHE_ENABLED", "1") == "1"
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(CACHE_DIR, "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+IMAGE_CACHE_MAX_AGE = float(os.environ.get("IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+SHARED_CACHE_ENABLED = os.environ.get("SHARED_CACHE_ENABLED", "1") == "1"
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", os.path.join(CACHE_DIR, "shared.sqlite3"))
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+SHARED_CACHE_EVICT_INTERVAL = int(os.environ.get("SHARED_CACHE_EVICT_INTERVAL", "64"))
+SHARED_CACHE_EXCLUDED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive")
+
+IMAGE_TRANSFORM_WORKERS = int(os.environ.get("IMAGE_TRANSFORM_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_TRANSFORM_MAX_DIMENSION = int(os.environ.get("IMAGE_TRANSFORM_MAX_DIMENSION", "2048"))
+IMAGE_TRANSFORM_QUALITY = int(os.environ.get("IMAGE_TRANSFORM_QUALITY", "80"))
+CACHE_WARMER_ENABLED = os.environ.get("CACHE_WARMER_ENABLED", "1") == "1"
+CACHE_WARMER_INTERVAL = float(os.environ.get("CACHE_WARMER_INTERVAL", "300"))
+CACHE_WARMER_CONCURRENCY = int(os.environ.get("CACHE_WARMER_CONCURRENCY", "8"))
+CACHE_WARMER_LISTS = ("items/high-demand", "items/highest-value", "items/recent")
+
+CATALOG_INDEX_ENABLED = os.environ.get("CATALOG_INDEX_ENABLED", "0") == "1"
+CATALOG_SYNC_INTERVAL = float(os.environ.get("CATALOG_SYNC_INTERVAL", "600"))
+CATALOG_SYNC_PAGE_SIZE = int(os.environ.get("CATALOG_SYNC_PAGE_SIZE", "100"))
+CATALOG_SYNC_MAX_PAGES = int(os.environ.get("CATALOG_SYNC_MAX_PAGES", "500"))
+CATALOG_DEFAULT_LIMIT = int(os.environ.get("CATALOG_DEFAULT_LIMIT", "20"))
+CATALOG_SORT_KEYS = ("value-desc", "value-asc", "name-asc", "name-desc")
+CATALOG_QUERY_PARAMS = ("search", "sort", "variant", "category", "page", "limit")
+RECORD_LIST_KEYS = ("items", "data", "results", "pets", "hatches", "tradeAds", "ads", "records")
+PAGINATION_MORE_KEYS = ("hasMore", "hasNextPage")
+PAGINATION_PAGE_COUNT_KEYS = ("totalPages", "pages")
+PAGINATION_TOTAL_KEYS = ("total", "totalItems")
+
+OG_INDEX_MAX_ENTRIES = int(os.environ.get("OG_INDEX_MAX_ENTRIES", "10000"))
+CRAWLER_USER_AGENTS = re.compile(
+    r"discordbot|twitterbot|slackbot|slack-imgproxy|facebookexternalhit|facebot|linkedinbot|telegrambot|whatsapp|"
+    r"skypeuripreview|redditbot|embedly|iframely|pinterest|mastodon|bluesky|vkshare|snapchat|embedbot",
+    re.IGNORECASE,
+)
+
+BATCH_MAX_PATHS = int(os.environ.get("BATCH_MAX_PATHS", "50"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_ITEM_TIMEOUT = float(os.environ.get("BATCH_ITEM_TIMEOUT", "10"))
+
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "100"))
+EXPORT_MAX_PAGES = int(os.environ.get("EXPORT_MAX_PAGES", "10000"))
+EXPORT_QUERY_PARAMS = ("cursor", "page", "limit", "max_pages")
+
+LIVE_PATHS = ("hatches", "stats")
+LIVE_POLL_INTERVAL = float(os.environ.get("LIVE_POLL_INTERVAL", "5"))
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "64"))
+LIVE_KEEPALIVE_INTERVAL = float(os.environ.get("LIVE_KEEPALIVE_INTERVAL", "15"))
+LIVE_MAX_POLLERS = int(os.environ.get("LIVE_MAX_POLLERS", "32"))
+
+IMAGE_TRANSFORM_FORMATS = {
+    "webp": "WEBP",
+    "png": "PNG",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+}
 
 COMMON_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
     "Origin": API_BASE_URL,
 }
 
-def generate_api_response_html(json_data_str: str, page_title: str, og_description: str, og_image_url: str, og_url: str, favicon_url: str) -> str:
+API_HEADERS = {
+    **COMMON_HEADERS,
+    "Accept": "application/json, text/plain, */*",
+    "Referer": f"{API_BASE_URL}/",
+}
+
+IMAGE_HEADERS = {
+    **COMMON_HEADERS,
+    "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+    "Referer": f"{IMAGE_BASE_URL}/",
+}
+
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "1") == "1" and HTTP2_AVAILABLE
+UPSTREAM_WARMUP_CONNECTIONS = int(os.environ.get("UPSTREAM_WARMUP_CONNECTIONS", "1"))
+UPSTREAM_WARMUP_TIMEOUT = float(os.environ.get("UPSTREAM_WARMUP_TIMEOUT", "5"))
+UPSTREAM_CONCURRENCY_LIMIT = int(os.environ.get("UPSTREAM_CONCURRENCY_LIMIT", "64"))
+UPSTREAM_QUEUE_LIMIT = int(os.environ.get("UPSTREAM_QUEUE_LIMIT", "256"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", "2"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "10"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", "1"))
+CIRCUIT_FAILURE_STATUSES = (502, 503, 504)
+API_UPSTREAM_TIMEOUT = httpx.Timeout(
+    connect=float(os.environ.get("API_CONNECT_TIMEOUT", "2")),
+    read=float(os.environ.get("API_READ_TIMEOUT", "10")),
+    write=float(os.environ.get("API_WRITE_TIMEOUT", "5")),
+    pool=float(os.environ.get("API_POOL_TIMEOUT", "2")),
+)
+IMAGE_UPSTREAM_TIMEOUT = httpx.Timeout(
+    connect=float(os.environ.get("IMAGE_CONNECT_TIMEOUT", "2")),
+    read=float(os.environ.get("IMAGE_READ_TIMEOUT", "20")),
+    write=float(os.environ.get("IMAGE_WRITE_TIMEOUT", "5")),
+    pool=float(os.environ.get("IMAGE_POOL_TIMEOUT", "2")),
+)
+UPSTREAM_RETRIES = int(os.environ.get("UPSTREAM_RETRIES", "2"))
+UPSTREAM_RETRY_BACKOFF = float(os.environ.get("UPSTREAM_RETRY_BACKOFF", "0.1"))
+UPSTREAM_RETRY_STATUSES = (502, 503, 504)
+UPSTREAM_HEDGE_ENABLED = os.environ.get("UPSTREAM_HEDGE_ENABLED", "0") == "1"
+UPSTREAM_HEDGE_MIN_DELAY = float(os.environ.get("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.environ.get("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_HEDGE_WINDOW = int(os.environ.get("UPSTREAM_HEDGE_WINDOW", "256"))
+UPSTREAM_HEDGE_BUDGET_RATIO = float(os.environ.get("UPSTREAM_HEDGE_BUDGET_RATIO", "0.05"))
+UPSTREAM_HEDGE_BUDGET_BURST = float(os.environ.get("UPSTREAM_HEDGE_BUDGET_BURST", "10"))
+API_CACHE_STALE_IF_ERROR = float(os.environ.get("API_CACHE_STALE_IF_ERROR", "3600"))
+
+UPSTREAM_CLIENTS: dict[str, httpx.AsyncClient] = {}
+UPSTREAM_IN_FLIGHT: dict[str, int] = {}
+
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+METRICS_API_ROOTS = ("conversations", "eggs", "hatches", "items", "reports", "stats", "trade-ads")
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(METRICS_LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self):
+        self.descriptions: dict[str, tuple[str, str]] = {}
+        self.values: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self.collectors = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self.descriptions[name] = (kind, help_text)
+        if kind == "histogram":
+            self.histograms.setdefault(name, {})
+        else:
+            self.values.setdefault(name, {})
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        series = self.values[name]
+        series[labels] = series.get(labels, 0) + value
+
+    def set(self, name: str, labels: tuple, value: float):
+        self.values[name][labels] = value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        series = self.histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect(self)
+        lines = []
+        for name, (kind, help_text) in self.descriptions.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for labels, histogram in self.histograms[name].items():
+                    cumulative = 0
+                    for bound, count in zip(METRICS_LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{format_metric_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{format_metric_labels(labels)} {histogram.count}")
+            else:
+                for labels, value in self.values[name].items():
+                    lines.append(f"{name}{format_metric_labels(labels)} {format_metric_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def format_metric_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def format_metric_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+METRICS = MetricsRegistry()
+METRICS.describe("bgsi_requests_total", "counter", "Requests served, by route template, method and status code.")
+METRICS.describe("bgsi_request_duration_seconds", "histogram", "Time from request start to the last response byte, by route template.")
+METRICS.describe("bgsi_requests_in_flight", "gauge", "Requests currently being served, by route template.")
+METRICS.describe("bgsi_response_bytes_total", "counter", "Response body bytes sent to clients after compression, by route template.")
+METRICS.describe("bgsi_request_errors_total", "counter", "Unhandled exceptions raised while serving a request, by route template and exception class.")
+METRICS.describe("bgsi_upstream_requests_total", "counter", "Upstream requests, by upstream host and status code.")
+METRICS.describe("bgsi_upstream_duration_seconds", "histogram", "Upstream latency until the response headers (streams) or the full body arrived, by upstream host.")
+METRICS.describe("bgsi_upstream_errors_total", "counter", "Upstream requests that failed without a response, by upstream host and exception class.")
+METRICS.describe("bgsi_upstream_response_bytes_total", "counter", "Response body bytes received from upstream, by upstream host.")
+METRICS.describe("bgsi_upstream_retries_total", "counter", "Upstream GETs retried after a connect error or 502/503/504, by upstream host and reason.")
+METRICS.describe("bgsi_upstream_hedges_total", "counter", "Hedged upstream GETs, by upstream host and outcome (sent, won, over_budget).")
+METRICS.describe("bgsi_render_duration_seconds", "histogram", "Time spent parsing upstream JSON and rendering HTML pages, by phase.")
+
+def upstream_label(base_url: str) -> tuple:
+    return (("upstream", httpx.URL(base_url).host),)
+
+def record_upstream_result(base_url: str, started: float, response: httpx.Response | None, error: BaseException | None):
+    labels = upstream_label(base_url)
+    METRICS.observe("bgsi_upstream_duration_seconds", labels, time.perf_counter() - started)
+    if response is not None:
+        METRICS.inc("bgsi_upstream_requests_total", labels + (("status", response.status_code),))
+    elif error is not None and not isinstance(error, asyncio.CancelledError):
+        METRICS.inc("bgsi_upstream_errors_total", labels + (("error", type(error).__name__),))
+
+class UpstreamUnavailable(httpx.RequestError):
+    def __init__(self, url: str, reason: str, retry_after: float):
+        super().__init__(f"{reason}; retry in {retry_after:.0f}s", request=httpx.Request("GET", url))
+        self.reason = reason
+        self.retry_after = retry_after
+
+class UpstreamGuard:
+    def __init__(self, base_url: str, limit: int, queue_limit: int, queue_timeout: float):
+        self.base_url = base_url
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.counters = {"admitted": 0, "queued": 0, "shed": 0, "queue_timeouts": 0, "rejected_open": 0, "opened": 0, "closed": 0}
+
+    def reject(self, url: str, counter: str, reason: str, retry_after: float):
+        self.counters[counter] += 1
+        raise UpstreamUnavailable(url, reason, retry_after)
+
+    def check_circuit(self, url: str):
+        if self.state != "open":
+            return
+        remaining = self.opened_at + CIRCUIT_RESET_TIMEOUT - time.monotonic()
+        if remaining > 0:
+            self.reject(url, "rejected_open", "Upstream circuit is open", remaining)
+        self.state = "half_open"
+        self.probes = 0
+
+    async def acquire(self, url: str) -> bool:
+        self.check_circuit(url)
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+        elif len(self.waiters) >= self.queue_limit:
+            self.reject(url, "shed", "Upstream queue is full", 1)
+        else:
+            self.counters["queued"] += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not waiter.done():
+                    waiter.cancel()
+                    self.waiters.remove(waiter)
+                    self.reject(url, "queue_timeouts", "Timed out waiting for an upstream slot", 1)
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release_slot()
+                else:
+                    waiter.cancel()
+                    self.waiters.remove(waiter)
+                raise
+
+        if self.state == "half_open":
+            if self.probes >= CIRCUIT_HALF_OPEN_PROBES:
+                self.release_slot()
+                self.reject(url, "rejected_open", "Upstream circuit is half-open", 1)
+            self.probes += 1
+            self.counters["admitted"] += 1
+            return True
+        self.counters["admitted"] += 1
+        return False
+
+    def release_slot(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def record(self, probe: bool, succeeded: bool | None):
+        if succeeded:
+            self.failures = 0
+            if self.state != "closed":
+                self.state = "closed"
+                self.counters["closed"] += 1
+        elif succeeded is None:
+            if probe and self.state == "half_open":
+                self.probes -= 1
+        else:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= CIRCUIT_FAILURE_THRESHOLD):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.counters["opened"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "state": self.state,
+            "active": self.active,
+            "waiting": len(self.waiters),
+            "consecutive_failures": self.failures,
+            "limit": self.limit,
+            "queue_limit": self.queue_limit,
+        }
+
+UPSTREAM_GUARDS: dict[str, UpstreamGuard] = {}
+
+def get_upstream_guard(base_url: str) -> UpstreamGuard:
+    guard = UPSTREAM_GUARDS.get(base_url)
+    if guard is None:
+        guard = UPSTREAM_GUARDS[base_url] = UpstreamGuard(base_url, UPSTREAM_CONCURRENCY_LIMIT, UPSTREAM_QUEUE_LIMIT, UPSTREAM_QUEUE_TIMEOUT)
+    return guard
+
+def is_upstream_failure(response: httpx.Response | None, error: BaseException | None) -> bool | None:
+    if response is not None:
+        return response.status_code in CIRCUIT_FAILURE_STATUSES
+    if isinstance(error, httpx.PoolTimeout):
+        return None
+    if isinstance(error, httpx.TransportError):
+        return True
+    return None
+
+def create_upstream_client(base_url: str, headers: dict) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, http2=UPSTREAM_HTTP2, follow_redirects=True)
+
+def get_upstream_client(base_url: str) -> httpx.AsyncClient:
+    client = UPSTREAM_CLIENTS.get(base_url)
+    if client is None or client.is_closed:
+        client = create_upstream_client(base_url, API_HEADERS if base_url == API_BASE_URL else IMAGE_HEADERS)
+        UPSTREAM_CLIENTS[base_url] = client
+    return client
+
+def upstream_timeout(base_url: str) -> httpx.Timeout:
+    return API_UPSTREAM_TIMEOUT if base_url == API_BASE_URL else IMAGE_UPSTREAM_TIMEOUT
+
+class GuardedUpstreamStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            release, self.release = self.release, None
+            if release is not None:
+                release()
+
+async def upstream_attempt(base_url: str, url: str, headers: dict | None, stream: bool) -> httpx.Response:
+    client = get_upstream_client(base_url)
+    guard = get_upstream_guard(base_url)
+    probe = await guard.acquire(url)
+    UPSTREAM_IN_FLIGHT[base_url] = UPSTREAM_IN_FLIGHT.get(base_url, 0) + 1
+
+    def release():
+        UPSTREAM_IN_FLIGHT[base_url] -= 1
+        guard.release_slot()
+
+    started = time.perf_counter()
+    response = error = None
+    try:
+        request = client.build_request("GET", url, headers=headers, timeout=upstream_timeout(base_url))
+        response = await client.send(request, stream=stream)
+        if not stream:
+            METRICS.inc("bgsi_upstream_response_bytes_total", upstream_label(base_url), len(response.content))
+        return response
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        failed = is_upstream_failure(response, error)
+        guard.record(probe, None if failed is None else not failed)
+        if stream and response is not None and not response.is_closed:
+            response.stream = GuardedUpstreamStream(response.stream, release)
+        else:
+            release()
+        record_upstream_result(base_url, started, response, error)
+        if failed is False:
+            UPSTREAM_LATENCIES.setdefault(base_url, deque(maxlen=UPSTREAM_HEDGE_WINDOW)).append(time.perf_counter() - started)
+
+class HedgeBudget:
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def earn(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+UPSTREAM_LATENCIES: dict[str, deque] = {}
+HEDGE_BUDGET = HedgeBudget(UPSTREAM_HEDGE_BUDGET_RATIO, UPSTREAM_HEDGE_BUDGET_BURST)
+
+def hedge_delay(base_url: str) -> float | None:
+    samples = UPSTREAM_LATENCIES.get(base_url)
+    if not UPSTREAM_HEDGE_ENABLED or samples is None or len(samples) < UPSTREAM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return max(UPSTREAM_HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95)])
+
+async def hedged_get(base_url: str, url: str, headers: dict | None) -> httpx.Response:
+    HEDGE_BUDGET.earn()
+    primary = asyncio.ensure_future(upstream_attempt(base_url, url, headers, stream=False))
+    delay = hedge_delay(base_url)
+    if delay is None:
+        return await primary
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done:
+        return primary.result()
+    if not HEDGE_BUDGET.spend():
+        METRICS.inc("bgsi_upstream_hedges_total", upstream_label(base_url) + (("outcome", "over_budget"),))
+        return await primary
+
+    METRICS.inc("bgsi_upstream_hedges_total", upstream_label(base_url) + (("outcome", "sent"),))
+    hedge = asyncio.ensure_future(upstream_attempt(base_url, url, headers, stream=False))
+    pending = {primary, hedge}
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        METRICS.inc("bgsi_upstream_hedges_total", upstream_label(base_url) + (("outcome", "won"),))
+                    return task.result()
+            if not pending:
+                return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def should_retry(response: httpx.Response | None, error: BaseException | None) -> bool:
+    if response is not None:
+        return response.status_code in UPSTREAM_RETRY_STATUSES
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+async def upstream_request(base_url: str, url: str, headers: dict | None, stream: bool) -> httpx.Response:
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        response = error = None
+        try:
+            if stream:
+                response = await upstream_attempt(base_url, url, headers, stream=True)
+            else:
+                response = await hedged_get(base_url, url, headers)
+        except httpx.RequestError as e:
+            error = e
+        if attempt == UPSTREAM_RETRIES or not should_retry(response, error):
+            if error is not None:
+                raise error
+            return response
+        reason = type(error).__name__ if error is not None else str(response.status_code)
+        METRICS.inc("bgsi_upstream_retries_total", upstream_label(base_url) + (("reason", reason),))
+        if response is not None:
+            await response.aclose()
+        await asyncio.sleep(random.uniform(0, UPSTREAM_RETRY_BACKOFF * 2 ** attempt))
+
+async def upstream_get(base_url: str, url: str, headers: dict | None = None) -> httpx.Response:
+    return await upstream_request(base_url, url, headers, stream=False)
+
+async def upstream_stream(base_url: str, url: str, headers: dict | None = None) -> httpx.Response:
+    return await upstream_request(base_url, url, headers, stream=True)
+
+def response_digest(response: httpx.Response) -> str:
+    digest = response.extensions.get("body_digest")
+    if digest is None:
+        digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        response.extensions["body_digest"] = digest
+    return digest
+
+def make_etag(digest: str, variant: str = "") -> str:
+    return f'"{digest}-{variant}"' if variant else f'"{digest}"'
+
+def upstream_validators(headers) -> dict:
+    validators = {}
+    if "etag" in headers:
+        validators["If-None-Match"] = headers["etag"]
+    if "last-modified" in headers:
+        validators["If-Modified-Since"] = headers["last-modified"]
+    return validators
+
+def parse_etag_list(value: str) -> set[str]:
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
+
+def is_not_modified(request: Request, etag: str | None, last_modified: str | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        candidates = parse_etag_list(if_none_match)
+        return "*" in candidates or etag.removeprefix("W/") in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers={name: value for name, value in headers.items() if value is not None})
+
+class SingleFlight:
+    def __init__(self):
+        self.calls: dict[str, asyncio.Task] = {}
+        self.counters = {"leaders": 0, "collapsed": 0, "errors": 0}
+
+    async def do(self, key: str, func):
+        task = self.calls.get(key)
+        if task is not None:
+            self.counters["collapsed"] += 1
+            return await asyncio.shield(task)
+
+        self.counters["leaders"] += 1
+        task = asyncio.ensure_future(func())
+        self.calls[key] = task
+
+        def forget(finished: asyncio.Task):
+            if self.calls.get(key) is finished:
+                del self.calls[key]
+            if not finished.cancelled() and finished.exception() is not None:
+                self.counters["errors"] += 1
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self.calls)}
+
+UPSTREAM_FLIGHTS = SingleFlight()
+
+async def coalesced_get(base_url: str, url: str) -> httpx.Response:
+    return await UPSTREAM_FLIGHTS.do(url, lambda: upstream_get(base_url, url))
+
+class UnexpectedContentType(Exception):
+    def __init__(self, url: str, content_type: str):
+        super().__init__(f"{url} returned {content_type}")
+        self.url = url
+        self.content_type = content_type
+
+class StreamBroadcast:
+    def __init__(self, key: str, response: httpx.Response, sink=None):
+        self.key = key
+        self.response = response
+        self.sink = sink
+        self.chunks: list[bytes] = []
+        self.base = 0
+        self.buffered = 0
+        self.positions: dict[int, int] = {}
+        self.next_reader = 0
+        self.abandoned = False
+        self.finished = False
+        self.error: BaseException | None = None
+        self.changed = asyncio.Event()
+        self.pump_task = spawn_background_task(self.pump())
+
+    @property
+    def joinable(self) -> bool:
+        return self.base == 0 and not self.finished and not self.abandoned
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def pump(self):
+        try:
+            async for chunk in self.response.aiter_bytes(IMAGE_STREAM_CHUNK_SIZE):
+                while self.buffered >= IMAGE_STREAM_BUFFER_BYTES:
+                    try:
+                        await asyncio.wait_for(self.changed.wait(), IMAGE_STREAM_IDLE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        self.drop_slowest_readers()
+                METRICS.inc("bgsi_upstream_response_bytes_total", upstream_label(IMAGE_BASE_URL), len(chunk))
+                if self.sink is not None:
+                    self.sink.write(chunk)
+                self.chunks.append(chunk)
+                self.buffered += len(chunk)
+                self.trim()
+            if self.sink is not None:
+                await self.sink.commit()
+                self.sink = None
+        except httpx.HTTPError as e:
+            self.error = e
+        finally:
+            if self.sink is not None:
+                self.sink.abort()
+            self.finished = True
+            if ACTIVE_IMAGE_STREAMS.get(self.key) is self:
+                del ACTIVE_IMAGE_STREAMS[self.key]
+            await self.response.aclose()
+            self.notify()
+
+    def drop_slowest_readers(self):
+        lowest = min(self.positions.values(), default=None)
+        for reader, position in list(self.positions.items()):
+            if position == lowest:
+                del self.positions[reader]
+        if not self.positions:
+            self.abandoned = True
+        self.trim()
+
+    def trim(self):
+        if self.positions:
+            lowest = min(self.positions.values())
+            while self.base < lowest and self.buffered > IMAGE_STREAM_BUFFER_BYTES // 2:
+                self.buffered -= len(self.chunks.pop(0))
+                self.base += 1
+        elif self.abandoned:
+            self.base += len(self.chunks)
+            self.chunks.clear()
+            self.buffered = 0
+        self.notify()
+
+    def subscribe(self) -> int | None:
+        if self.base != 0 or self.abandoned:
+            return None
+        reader = self.next_reader
+        self.next_reader += 1
+        self.positions[reader] = 0
+        return reader
+
+    def unsubscribe(self, reader: int):
+        self.positions.pop(reader, None)
+        if not self.positions and not self.finished:
+            self.abandoned = True
+            if self.sink is None:
+                self.pump_task.cancel()
+        self.trim()
+
+    async def read(self, reader: int):
+        try:
+            while True:
+                if reader not in self.positions:
+                    raise httpx.ReadError(f"Stream reader for {self.key} fell too far behind.")
+                position = self.positions[reader]
+                if position < self.base + len(self.chunks):
+                    chunk = self.chunks[position - self.base]
+                    self.positions[reader] = position + 1
+                    self.trim()
+                    yield chunk
+                elif self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self.changed.wait()
+        finally:
+            self.unsubscribe(reader)
+
+ACTIVE_IMAGE_STREAMS: dict[str, StreamBroadcast] = {}
+
+async def raise_image_stream_error(item_path: str, response: httpx.Response):
+    body = b""
+    try:
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) >= ERROR_BODY_MAX_BYTES:
+                break
+    finally:
+        await response.aclose()
+    failure = truncated_error_response(response, body)
+    if failure.status_code in NEGATIVE_CACHE_STATUSES:
+        NEGATIVE_CACHE.set(f"image:{item_path}", failure)
+    raise_upstream_status(failure)
+
+async def check_image_content_type(item_path: str, url: str, response: httpx.Response, allow_any_content_type: bool) -> str:
+    content_type = response.headers.get("content-type", "application/octet-stream")
+    if not allow_any_content_type and not content_type.lower().startswith("image/"):
+        await response.aclose()
+        NEGATIVE_CACHE.set(f"image:{item_path}", content_type)
+        raise UnexpectedContentType(url, content_type)
+    return content_type
+
+async def start_image_stream(item_path: str, url: str, allow_any_content_type: bool) -> StreamBroadcast:
+    response = await upstream_stream(IMAGE_BASE_URL, url)
+    if response.is_error:
+        await raise_image_stream_error(item_path, response)
+    content_type = await check_image_content_type(item_path, url, response, allow_any_content_type)
+    return broadcast_image_response(item_path, url, response, content_type)
+
+def broadcast_image_response(item_path: str, url: str, response: httpx.Response, content_type: str) -> StreamBroadcast:
+    sink = None
+    if IMAGE_CACHE_ENABLED and "content-encoding" not in response.headers:
+        sink = IMAGE_CACHE.writer(item_path, content_type, image_response_headers(response))
+    broadcast = StreamBroadcast(url, response, sink)
+    ACTIVE_IMAGE_STREAMS[url] = broadcast
+    return broadcast
+
+async def open_image_stream(item_path: str, url: str, allow_any_content_type: bool) -> StreamBroadcast:
+    broadcast = ACTIVE_IMAGE_STREAMS.get(url)
+    if broadcast is not None and broadcast.joinable:
+        UPSTREAM_FLIGHTS.counters["collapsed"] += 1
+        return broadcast
+    return await UPSTREAM_FLIGHTS.do(f"stream:{url}", lambda: start_image_stream(item_path, url, allow_any_content_type))
+
+async def prefetch_image(item_path: str, url: str, allow_any_content_type: bool):
+    try:
+        broadcast = await open_image_stream(item_path, url, allow_any_content_type)
+    except (httpx.HTTPError, UnexpectedContentType):
+        return
+    reader = broadcast.subscribe()
+    if reader is not None:
+        broadcast.unsubscribe(reader)
+
+async def relay_upstream_body(response: httpx.Response):
+    try:
+        async for chunk in response.aiter_bytes(IMAGE_STREAM_CHUNK_SIZE):
+            METRICS.inc("bgsi_upstream_response_bytes_total", upstream_label(IMAGE_BASE_URL), len(chunk))
+            yield chunk
+    finally:
+        await response.aclose()
+
+async def forward_image_range(request: Request, item_path: str, url: str, allow_any_content_type: bool) -> Response:
+    headers = {"Range": request.headers["range"], "Accept-Encoding": "identity"}
+    if "if-range" in request.headers:
+        headers["If-Range"] = request.headers["if-range"]
+    response = await upstream_stream(IMAGE_BASE_URL, url, headers)
+    if response.status_code == 416:
+        await response.aclose()
+        return Response(status_code=416, headers={name: response.headers[name] for name in RANGE_PASSTHROUGH_HEADERS if name in response.headers})
+    if response.is_error:
+        await raise_image_stream_error(item_path, response)
+    if response.status_code == 206:
+        content_type = response.headers.get("content-type", "application/octet-stream")
+    else:
+        content_type = await check_image_content_type(item_path, url, response, allow_any_content_type)
+    if IMAGE_CACHE_ENABLED and url not in ACTIVE_IMAGE_STREAMS:
+        spawn_background_task(prefetch_image(item_path, url, allow_any_content_type))
+    response_headers = image_response_headers(response)
+    response_headers.update((name, response.headers[name]) for name in RANGE_PASSTHROUGH_HEADERS if name in response.headers)
+    return StreamingResponse(relay_upstream_body(response), status_code=response.status_code, media_type=content_type, headers=response_headers)
+
+async def revalidate_cached_image(item_path: str, url: str, cached: dict, allow_any_content_type: bool) -> StreamBroadcast | None:
+    async def revalidate() -> StreamBroadcast | None:
+        response = await upstream_stream(IMAGE_BASE_URL, url, cached["validators"] or None)
+        if response.status_code == 304 or response.status_code >= 500:
+            await response.aclose()
+            if response.status_code == 304:
+                await asyncio.to_thread(IMAGE_CACHE.touch, item_path)
+            return None
+        if response.is_error:
+            await raise_image_stream_error(item_path, response)
+        content_type = await check_image_content_type(item_path, url, response, allow_any_content_type)
+        return broadcast_image_response(item_path, url, response, content_type)
+
+    return await UPSTREAM_FLIGHTS.do(f"revalidate:{url}", revalidate)
+
+IMAGE_TRANSFORM_EXECUTOR = ThreadPoolExecutor(max_workers=IMAGE_TRANSFORM_WORKERS, thread_name_prefix="image-transform")
+
+def parse_image_transform(query_params) -> tuple[int | None, int | None, str | None] | None:
+    width = query_params.get("w")
+    height = query_params.get("h")
+    format_name = query_params.get("format")
+    if not (width or height or format_name):
+        return None
+    dimensions = []
+    for value in (width, height):
+        if not value:
+            dimensions.append(None)
+            continue
+        dimension = int(value)
+        if not 1 <= dimension <= IMAGE_TRANSFORM_MAX_DIMENSION:
+            raise ValueError(f"Dimensions must be between 1 and {IMAGE_TRANSFORM_MAX_DIMENSION} pixels.")
+        dimensions.append(dimension)
+    if format_name:
+        format_name = format_name.lower()
+        if format_name not in IMAGE_TRANSFORM_FORMATS:
+            raise ValueError(f"Unsupported format '{format_name}'. Use one of: {', '.join(IMAGE_TRANSFORM_FORMATS)}.")
+        format_name = IMAGE_TRANSFORM_FORMATS[format_name].lower()
+    return dimensions[0], dimensions[1], format_name
+
+def image_variant_key(item_path: str, transform: tuple) -> str:
+    width, height, format_name = transform
+    params = [(name, value) for name, value in (("format", format_name), ("h", height), ("w", width)) if value]
+    return f"{item_path}?{urlencode(params)}"
+
+def transform_image(source, width: int | None, height: int | None, format_name: str | None) -> tuple[bytes, str] | None:
+    with Image.open(source) as image:
+        if getattr(image, "is_animated", False):
+            return None
+        image.load()
+        target_format = format_name.upper() if format_name else image.format
+        if width or height:
+            image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+        if target_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, target_format, quality=IMAGE_TRANSFORM_QUALITY)
+        return buffer.getvalue(), Image.MIME.get(target_format, "application/octet-stream")
+
+async def load_original_image(item_path: str, url: str):
+    if IMAGE_CACHE_ENABLED:
+        cached = await asyncio.to_thread(IMAGE_CACHE.lookup, item_path)
+        if cached is not None and not cached["stale"]:
+            return cached["file_path"], cached["headers"]
+    response = await coalesced_get(IMAGE_BASE_URL, url)
+    if response.is_error:
+        failure = truncated_error_response(response, response.content)
+        if failure.status_code in NEGATIVE_CACHE_STATUSES:
+            NEGATIVE_CACHE.set(f"image:{item_path}", failure)
+        raise_upstream_status(failure)
+    content_type = response.headers.get("content-type", "application/octet-stream")
+    if not content_type.lower().startswith("image/"):
+        NEGATIVE_CACHE.set(f"image:{item_path}", content_type)
+        raise UnexpectedContentType(url, content_type)
+    headers = image_response_headers(response)
+    if IMAGE_CACHE_ENABLED:
+        await asyncio.to_thread(IMAGE_CACHE.store_bytes, item_path, response.content, content_type, headers)
+    return io.BytesIO(response.content), headers
+
+async def render_image_variant(item_path: str, url: str, variant_key: str, transform: tuple) -> tuple[bytes, str, dict] | None:
+    source, original_headers = await load_original_image(item_path, url)
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(IMAGE_TRANSFORM_EXECUTOR, transform_image, source, *transform)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    if result is None:
+        return None
+    data, content_type = result
+    headers = {"etag": make_etag(hashlib.sha256(data).hexdigest()[:32])}
+    if "cache-control" in original_headers:
+        headers["cache-control"] = original_headers["cache-control"]
+    if IMAGE_CACHE_ENABLED:
+        await asyncio.to_thread(IMAGE_CACHE.store_bytes, variant_key, data, content_type, headers)
+    return data, content_type, headers
+
+async def serve_transformed_image(request: Request, item_path: str, url: str, transform: tuple) -> Response | None:
+    variant_key = image_variant_key(item_path, transform)
+    if IMAGE_CACHE_ENABLED:
+        cached = await asyncio.to_thread(IMAGE_CACHE.lookup, variant_key)
+        if cached is not None and not cached["stale"]:
+            return cached_image_response(request, cached)
+    result = await UPSTREAM_FLIGHTS.do(f"transform:{variant_key}", lambda: render_image_variant(item_path, url, variant_key, transform))
+    if result is None:
+        return None
+    data, content_type, headers = result
+    if is_not_modified(request, headers.get("etag"), None):
+        return not_modified_response(headers)
+    return Response(content=data, media_type=content_type, headers=headers)
+
+def cached_image_response(request: Request, cached: dict) -> Response:
+    headers = cached["headers"]
+    if is_not_modified(request, headers.get("etag"), headers.get("last-modified")):
+        return not_modified_response(headers)
+    return FileResponse(cached["file_path"], media_type=cached["content_type"], headers=headers)
+
+def image_response_headers(response: httpx.Response) -> dict:
+    headers = {name: response.headers[name] for name in IMAGE_PASSTHROUGH_HEADERS if name in response.headers}
+    if "content-length" in response.headers and "content-encoding" not in response.headers:
+        headers["content-length"] = response.headers["content-length"]
+    return headers
+
+async def warm_upstream_connections():
+    async def warm(base_url: str):
+        client = get_upstream_client(base_url)
+        try:
+            await client.head("/", timeout=UPSTREAM_WARMUP_TIMEOUT)
+        except httpx.HTTPError:
+            pass
+
+    await asyncio.gather(*(
+        warm(base_url)
+        for base_url in UPSTREAM_CLIENTS
+        for _ in range(UPSTREAM_WARMUP_CONNECTIONS)
+    ))
+
+def describe_upstream_pool(base_url: str, client: httpx.AsyncClient) -> dict:
+    pool = getattr(client._transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        "http2": UPSTREAM_HTTP2,
+        "max_connections": UPSTREAM_MAX_CONNECTIONS,
+        "max_keepalive_connections": UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": UPSTREAM_KEEPALIVE_EXPIRY,
+        "connections": len(connections),
+        "active_connections": len(connections) - idle,
+        "idle_connections": idle,
+        "in_flight_requests": UPSTREAM_IN_FLIGHT.get(base_url, 0),
+        "utilization": round((len(connections) - idle) / UPSTREAM_MAX_CONNECTIONS, 4) if UPSTREAM_MAX_CONNECTIONS else 0,
+    }
+
+API_CACHE_MAX_ENTRIES = int(os.environ.get("API_CACHE_MAX_ENTRIES", "2048"))
+API_CACHE_MAX_BYTES = int(os.environ.get("API_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+NEGATIVE_CACHE_TTL = float(os.environ.get("NEGATIVE_CACHE_TTL", "30"))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.environ.get("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))
+NEGATIVE_CACHE_STATUSES = (404, 410)
+ERROR_BODY_MAX_BYTES = int(os.environ.get("ERROR_BODY_MAX_BYTES", "1000"))
+
+API_CACHE_POLICIES = (
+    (re.compile(r"^stats$"), 5, 30),
+    (re.compile(r"^hatches$"), 3, 15),
+    (re.compile(r"^trade-ads$"), 10, 30),
+    (re.compile(r"^items$"), 30, 120),
+    (re.compile(r"^items/(high-demand|highest-value|recent)$"), 60, 300),
+    (re.compile(r"^items/[^/]+$"), 300, 3600),
+    (re.compile(r"^eggs(/[^/]+)?$"), 600, 3600),
+)
+
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+
+def spawn_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+class CacheEntry:
+    __slots__ = ("response", "stored_at", "expires_at", "stale_until", "error_until", "size")
+
+    def __init__(self, response: httpx.Response, ttl: float, stale_ttl: float):
+        self.response = response
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+        self.stale_until = self.expires_at + stale_ttl
+        self.error_until = self.stale_until + API_CACHE_STALE_IF_ERROR
+        self.size = len(response.content) + sum(len(k) + len(v) for k, v in response.headers.raw)
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def is_usable(self, now: float) -> bool:
+        return now < self.stale_until
+
+    def is_usable_on_error(self, now: float) -> bool:
+        return now < self.error_until
+
+class ResponseCache:
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.size = 0
+        self.counters = {"hits": 0, "stale_hits": 0, "error_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "refreshes": 0, "revalidations": 0}
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_usable_on_error(time.monotonic()):
+            self.discard(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, response: httpx.Response, ttl: float, stale_ttl: float) -> CacheEntry | None:
+        entry = CacheEntry(response, ttl, stale_ttl)
+        if entry.size > self.max_bytes:
+            return None
+        self.discard(key)
+        self.entries[key] = entry
+        self.size += entry.size
+        self.counters["stores"] += 1
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.counters["evictions"] += 1
+        return entry
+
+    def discard(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+API_CACHE = ResponseCache(API_CACHE_MAX_ENTRIES, API_CACHE_MAX_BYTES)
+API_CACHE_REFRESHING: set[str] = set()
+
+class NegativeCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self.counters = {"hits": 0, "stores": 0, "evictions": 0}
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.counters["hits"] += 1
+        return entry[1]
+
+    def set(self, key: str, failure):
+        if self.ttl <= 0:
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic() + self.ttl, failure)
+        self.counters["stores"] += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self.entries), "ttl": self.ttl, "max_entries": self.max_entries}
+
+NEGATIVE_CACHE = NegativeCache(NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_MAX_ENTRIES)
+
+def truncated_error_response(response: httpx.Response, body: bytes) -> httpx.Response:
+    headers = [(name, value) for name, value in response.headers.multi_items() if name not in SHARED_CACHE_EXCLUDED_HEADERS]
+    return httpx.Response(response.status_code, headers=headers, content=body[:ERROR_BODY_MAX_BYTES], request=response.request)
+
+def raise_upstream_status(response: httpx.Response):
+    raise httpx.HTTPStatusError(
+        f"Upstream returned {response.status_code} for url '{response.request.url}'",
+        request=response.request,
+        response=response,
+    )
+
+class SharedDiskCache:
+    def __init__(self, path: str, max_bytes: int, grace: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.db: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, status INTEGER NOT NULL, headers TEXT NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, stale_until REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_stale_until ON entries (stale_until)")
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self.lock:
+            if self.db is None:
+                return None
+            try:
+                row = self.db.execute(
+                    "SELECT status, headers, body, expires_at, stale_until, last_access FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or now >= row[4] + self.grace:
+                    self.counters["misses"] += 1
+                    return None
+                if now - row[5] > 60:
+                    self.db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+            self.counters["hits"] += 1
+        status, headers, body, expires_at, stale_until, _ = row
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "body": body,
+            "ttl": expires_at - now,
+            "stale_ttl": stale_until - expires_at,
+        }
+
+    def set(self, key: str, status: int, headers: list, body: bytes, ttl: float, stale_ttl: float):
+        now = time.time()
+        headers_json = json.dumps(headers)
+        size = len(body) + len(headers_json)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if self.db is None:
+                return
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries (key, status, headers, body, size, expires_at, stale_until, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, status, headers_json, body, size, now + ttl, now + ttl + stale_ttl, now),
+                )
+                self.counters["stores"] += 1
+                self.writes += 1
+                if self.writes % SHARED_CACHE_EVICT_INTERVAL == 0:
+                    self.evict(now)
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+
+    def evict(self, now: float):
+        removed = self.db.execute("DELETE FROM entries WHERE stale_until < ?", (now - self.grace,)).rowcount
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self.db.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 16").fetchall()
+            if not rows:
+                break
+            self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+            total -= sum(size for _, size in rows)
+            removed += len(rows)
+        self.counters["evictions"] += removed
+
+    def stats(self) -> dict:
+        with self.lock:
+            if self.db is None:
+                return {"enabled": False}
+            entries, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {**self.counters, "enabled": True, "entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+SHARED_CACHE = SharedDiskCache(SHARED_CACHE_PATH, SHARED_CACHE_MAX_BYTES, API_CACHE_STALE_IF_ERROR)
+
+def get_api_cache_policy(path: str) -> tuple[float, float] | None:
+    for pattern, ttl, stale_ttl in API_CACHE_POLICIES:
+        if pattern.match(path):
+            return ttl, stale_ttl
+    return None
+
+PROXY_QUERY_PARAMS = ("format",)
+
+def normalize_query(query_params) -> str:
+    return urlencode(sorted((key, value) for key, value in query_params.multi_items() if key not in PROXY_QUERY_PARAMS))
+
+def wants_raw_json(request: Request) -> bool:
+    requested_format = request.query_params.get("format")
+    if requested_format:
+        return requested_format.lower() == "json"
+    accept = request.headers.get("accept", "")
+    return "application/json" in accept and "text/html" not in accept
+
+def load_json(data: bytes):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+def dump_json_bytes(json_data_obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(json_data_obj)
+        except TypeError:
+            pass
+    return json.dumps(json_data_obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+def pretty_json(json_data_obj) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(json_data_obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS).decode()
+        except TypeError:
+            pass
+    return json.dumps(json_data_obj, indent=2, sort_keys=True, ensure_ascii=False)
+
+def iter_pretty_json(json_data_obj, indent: str = ""):
+    values = json_data_obj.values() if isinstance(json_data_obj, dict) else json_data_obj if isinstance(json_data_obj, list) else ()
+    if not any(isinstance(value, (dict, list)) and value for value in values):
+        yield pretty_json(json_data_obj).replace("\n", "\n" + indent)
+        return
+    inner = indent + "  "
+    if isinstance(json_data_obj, dict):
+        yield "{"
+        for index, key in enumerate(sorted(json_data_obj)):
+            yield f'{"," if index else ""}\n{inner}{pretty_json(key)}: '
+            yield from iter_pretty_json(json_data_obj[key], inner)
+        yield f"\n{indent}}}"
+    else:
+        yield "["
+        for index, value in enumerate(json_data_obj):
+            yield f'{"," if index else ""}\n{inner}'
+            yield from iter_pretty_json(value, inner)
+        yield f"\n{indent}]"
+
+def build_api_url(path: str, query: str) -> str:
+    target_url = f"{API_BASE_URL}/api/{path}"
+    if query:
+        target_url += f"?{query}"
+    return target_url
+
+async def store_shared_api_response(key: str, response: httpx.Response, policy: tuple[float, float]):
+    headers = [(name, value) for name, value in response.headers.multi_items() if name not in SHARED_CACHE_EXCLUDED_HEADERS]
+    await asyncio.to_thread(SHARED_CACHE.set, f"api:{key}", response.status_code, headers, response.content, *policy)
+
+def store_api_response(key: str, response: httpx.Response, policy: tuple[float, float]):
+    API_CACHE.set(key, response, *policy)
+    if SHARED_CACHE.db is not None:
+        spawn_background_task(store_shared_api_response(key, response, policy))
+
+async def load_shared_api_entry(key: str, path: str, query: str) -> CacheEntry | None:
+    shared = await asyncio.to_thread(SHARED_CACHE.get, f"api:{key}")
+    if shared is None:
+        return None
+    response = httpx.Response(
+        shared["status"],
+        headers=shared["headers"],
+        content=shared["body"],
+        request=httpx.Request("GET", build_api_url(path, query)),
+    )
+    return API_CACHE.set(key, response, shared["ttl"], shared["stale_ttl"])
+
+async def refresh_api_cache_entry(key: str, path: str, query: str, policy: tuple[float, float], stale: httpx.Response):
+    try:
+        if SHARED_CACHE.db is not None:
+            shared = await load_shared_api_entry(key, path, query)
+            if shared is not None and shared.is_fresh(time.monotonic()):
+                return
+        validators = upstream_validators(stale.headers)
+        response = await upstream_get(API_BASE_URL, build_api_url(path, query), validators or None)
+        if response.status_code == 304:
+            store_api_response(key, stale, policy)
+            API_CACHE.counters["revalidations"] += 1
+        elif response.is_success:
+            store_api_response(key, response, policy)
+            API_CACHE.counters["refreshes"] += 1
+    except httpx.HTTPError:
+        pass
+    finally:
+        API_CACHE_REFRESHING.discard(key)
+
+async def fetch_api_response(path: str, query: str) -> tuple[httpx.Response, str]:
+    if path == "items" and ITEM_CATALOG is not None:
+        local = ITEM_CATALOG.answer(parse_qsl(query, keep_blank_values=True))
+        if local is not None:
+            return httpx.Response(
+                200,
+                content=local,
+                headers={"content-type": "application/json"},
+                request=httpx.Request("GET", build_api_url(path, query)),
+            ), "CATALOG"
+
+    key = f"{path}?{query}"
+    negative = NEGATIVE_CACHE.get(f"api:{key}")
+    if negative is not None:
+        return negative, "NEGATIVE"
+
+    policy = get_api_cache_policy(path)
+    if policy is None:
+        response = await coalesced_get(API_BASE_URL, build_api_url(path, query))
+        if response.status_code in NEGATIVE_CACHE_STATUSES:
+            NEGATIVE_CACHE.set(f"api:{key}", truncated_error_response(response, response.content))
+        return response, "BYPASS"
+
+    entry = API_CACHE.get(key)
+    source = ""
+    if (entry is None or not entry.is_usable(time.monotonic())) and SHARED_CACHE.db is not None:
+        shared = await load_shared_api_entry(key, path, query)
+        if shared is not None:
+            entry = shared
+            source = "-SHARED"
+    now = time.monotonic()
+    if entry is not None and entry.is_usable(now):
+        if entry.is_fresh(now):
+            API_CACHE.counters["hits"] += 1
+            return entry.response, f"HIT{source}"
+        API_CACHE.counters["stale_hits"] += 1
+        if key not in API_CACHE_REFRESHING:
+            API_CACHE_REFRESHING.add(key)
+            spawn_background_task(refresh_api_cache_entry(key, path, query, policy, entry.response))
+        return entry.response, f"STALE{source}"
+
+    API_CACHE.counters["misses"] += 1
+    try:
+        response = await coalesced_get(API_BASE_URL, build_api_url(path, query))
+    except httpx.RequestError:
+        if entry is None:
+            raise
+        API_CACHE.counters["error_hits"] += 1
+        return entry.response, "STALE-IF-ERROR"
+    if response.status_code >= 500 and entry is not None:
+        API_CACHE.counters["error_hits"] += 1
+        return entry.response, "STALE-IF-ERROR"
+    if response.is_success:
+        store_api_response(key, response, policy)
+    elif response.status_code in NEGATIVE_CACHE_STATUSES:
+        NEGATIVE_CACHE.set(f"api:{key}", truncated_error_response(response, response.content))
+    return response, "MISS"
+
+async def warm_api_response(path: str, query: str = "") -> httpx.Response:
+    response = await coalesced_get(API_BASE_URL, build_api_url(path, query))
+    policy = get_api_cache_policy(path)
+    if response.is_success and policy is not None:
+        store_api_response(f"{path}?{query}", response, policy)
+    return response
+
+class ImageCacheWriter:
+    def __init__(self, cache: "ImageDiskCache", path: str, content_type: str, headers: dict):
+        self.cache = cache
+        self.path = path
+        self.content_type = content_type
+        self.headers = {name: value for name, value in headers.items() if name != "content-length"}
+        self.file = tempfile.NamedTemporaryFile(dir=cache.tmp_dir, delete=False)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        if self.file is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_bytes:
+            self.abort()
+            return
+        try:
+            self.file.write(chunk)
+        except OSError:
+            self.cache.counters["errors"] += 1
+            self.abort()
+            return
+        self.digest.update(chunk)
+
+    async def commit(self):
+        if self.file is None:
+            return
+        try:
+            self.file.close()
+        except OSError:
+            self.cache.counters["errors"] += 1
+            self.abort()
+            return
+        await asyncio.to_thread(self.cache.store, self.path, self.file.name, self.digest.hexdigest(), self.size, self.content_type, self.headers)
+        self.file = None
+
+    def abort(self):
+        if self.file is None:
+            return
+        try:
+            self.file.close()
+        except OSError:
+            pass
+        try:
+            os.unlink(self.file.name)
+        except OSError:
+            pass
+        self.file = None
+
+class ImageDiskCache:
+    def __init__(self, directory: str, max_bytes: int, max_age: float):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.tmp_dir = os.path.join(directory, "tmp")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.db: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "revalidations": 0, "errors": 0}
+
+    def open(self):
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        abandoned_before = time.time() - 3600
+        for name in os.listdir(self.tmp_dir):
+            try:
+                tmp_path = os.path.join(self.tmp_dir, name)
+                if os.stat(tmp_path).st_mtime < abandoned_before:
+                    os.unlink(tmp_path)
+            except OSError:
+                pass
+        self.db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "path TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, content_type TEXT NOT NULL, "
+            "headers TEXT NOT NULL, stored_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        if "validators" not in {row[1] for row in self.db.execute("PRAGMA table_info(images)")}:
+            self.db.execute("ALTER TABLE images ADD COLUMN validators TEXT NOT NULL DEFAULT '{}'")
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_last_access ON images (last_access)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_digest ON images (digest)")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def writer(self, path: str, content_type: str, headers: dict) -> ImageCacheWriter | None:
+        try:
+            return ImageCacheWriter(self, path, content_type, headers)
+        except OSError:
+            self.counters["errors"] += 1
+            return None
+
+    def store_bytes(self, path: str, data: bytes, content_type: str, headers: dict):
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False) as tmp:
+                tmp.write(data)
+        except OSError:
+            self.counters["errors"] += 1
+            return
+        self.store(path, tmp.name, hashlib.sha256(data).hexdigest(), len(data), content_type, headers)
+
+    def lookup(self, path: str) -> dict | None:
+        if self.db is None:
+            return None
+        now = time.time()
+        with self.lock:
+            try:
+                row = self.db.execute(
+                    "SELECT digest, size, content_type, headers, validators, stored_at, last_access FROM images WHERE path = ?", (path,)
+                ).fetchone()
+                if row is None:
+                    self.counters["misses"] += 1
+                    return None
+                digest, size, content_type, headers, validators, stored_at, last_access = row
+                file_path = self.object_path(digest)
+                if not os.path.exists(file_path):
+                    self.counters["misses"] += 1
+                    return None
+                if now - last_access > 60:
+                    self.db.execute("UPDATE images SET last_access = ? WHERE path = ?", (now, path))
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+            self.counters["hits"] += 1
+        return {
+            "file_path": file_path,
+            "digest": digest,
+            "size": size,
+            "content_type": content_type,
+            "headers": json.loads(headers),
+            "validators": json.loads(validators),
+            "stored_at": stored_at,
+            "stale": now - stored_at > self.max_age,
+        }
+
+    def touch(self, path: str):
+        if self.db is None:
+            return
+        now = time.time()
+        with self.lock:
+            try:
+                self.db.execute("UPDATE images SET stored_at = ?, last_access = ? WHERE path = ?", (now, now, path))
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return
+        self.counters["revalidations"] += 1
+
+    def store(self, path: str, tmp_path: str, digest: str, size: int, content_type: str, headers: dict):
+        if self.db is None:
+            os.unlink(tmp_path)
+            return
+        now = time.time()
+        validators = upstream_validators(headers)
+        headers = {"etag": f'"{digest[:32]}"', "last-modified": formatdate(now, usegmt=True), **headers}
+        file_path = self.object_path(digest)
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            if os.path.exists(file_path):
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, file_path)
+        except OSError:
+            self.counters["errors"] += 1
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+        with self.lock:
+            try:
+                previous = self.db.execute("SELECT digest FROM images WHERE path = ?", (path,)).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO images (path, digest, size, content_type, headers, validators, stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, digest, size, content_type, json.dumps(headers), json.dumps(validators), now, now),
+                )
+                if previous is not None and previous[0] != digest:
+                    self.release_object(previous[0])
+                self.counters["stores"] += 1
+                self.evict()
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+
+    def release_object(self, digest: str) -> bool:
+        if self.db.execute("SELECT 1 FROM images WHERE digest = ? LIMIT 1", (digest,)).fetchone() is not None:
+            return False
+        try:
+            os.unlink(self.object_path(digest))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def total_bytes(self) -> int:
+        row = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM images GROUP BY digest)").fetchone()
+        return row[0]
+
+    def evict(self):
+        total = self.total_bytes()
+        while total > self.max_bytes:
+            row = self.db.execute("SELECT path, digest, size FROM images ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            path, digest, size = row
+            self.db.execute("DELETE FROM images WHERE path = ?", (path,))
+            if self.release_object(digest):
+                total -= size
+            self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        if self.db is None:
+            return {"enabled": False}
+        with self.lock:
+            try:
+                entries = self.db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+                total = self.total_bytes()
+            except sqlite3.Error:
+                entries = total = None
+        return {**self.counters, "enabled": True, "entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+IMAGE_CACHE = ImageDiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_AGE)
+
+def extract_records(json_data_obj) -> tuple[list, str | None]:
+    if isinstance(json_data_obj, list):
+        return json_data_obj, None
+    if not isinstance(json_data_obj, dict):
+        return [], None
+    for key in RECORD_LIST_KEYS:
+        value = json_data_obj.get(key)
+        if isinstance(value, list):
+            return value, key
+    for key, value in json_data_obj.items():
+        if isinstance(value, list) and value and all(isinstance(record, dict) for record in value):
+            return value, key
+    return [], None
+
+def pagination_has_more(json_data_obj, page: int, position: int) -> bool | None:
+    if not isinstance(json_data_obj, dict):
+        return None
+    containers = [json_data_obj] + [value for value in json_data_obj.values() if isinstance(value, dict)]
+    for container in containers:
+        for key in PAGINATION_MORE_KEYS:
+            if isinstance(container.get(key), bool):
+                return container[key]
+    for container in containers:
+        for keys, current in ((PAGINATION_PAGE_COUNT_KEYS, page), (PAGINATION_TOTAL_KEYS, position)):
+            for key in keys:
+                value = container.get(key)
+                if isinstance(value, int) and not isinstance(value, bool):
+                    return current < value
+    return None
+
+def bit_flags(bits: int) -> str:
+    return bin(bits)[:1:-1]
+
+def iter_bits(bits: int):
+    return (match.start() for match in re.finditer("1", bit_flags(bits)))
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class ItemCatalog:
+    def __init__(self, records: list[dict], envelope: dict, records_key: str | None, complete: bool):
+        self.records = records
+        self.envelope = envelope
+        self.records_key = records_key
+        self.complete = complete
+        self.names = [str(record.get("name") or record.get("slug") or "").lower() for record in records]
+        self.all_bits = (1 << len(records)) - 1
+        self.trigram_bits: dict[str, int] = {}
+        self.field_bits: dict[str, dict[str, int]] = {"variant": {}, "category": {}}
+        for index, (record, name) in enumerate(zip(records, self.names)):
+            bit = 1 << index
+            for trigram in trigrams(name):
+                self.trigram_bits[trigram] = self.trigram_bits.get(trigram, 0) | bit
+            for field, bitmaps in self.field_bits.items():
+                value = record.get(field)
+                if value is not None:
+                    key = str(value).lower()
+                    bitmaps[key] = bitmaps.get(key, 0) | bit
+        self.orderings: dict[str, list[int]] = {}
+        for sort_key in CATALOG_SORT_KEYS:
+            self.ordering(sort_key)
+        self.searches: OrderedDict[str, int] = OrderedDict()
+        self.counters = {"answered": 0, "fallbacks": 0}
+
+    def ordering(self, sort_key: str) -> list[int] | None:
+        if not sort_key:
+            return list(range(len(self.records)))
+        if sort_key in self.orderings:
+            return self.orderings[sort_key]
+        field, _, direction = sort_key.rpartition("-")
+        if not field or direction not in ("asc", "desc"):
+            return None
+        values = [record.get(field) for record in self.records]
+        present = [index for index, value in enumerate(values) if value is not None]
+        if not present:
+            return None
+        missing = [index for index, value in enumerate(values) if value is None]
+        if all(isinstance(values[index], (int, float)) and not isinstance(values[index], bool) for index in present):
+            sort_value = values.__getitem__
+        else:
+            sort_value = lambda index: str(values[index]).lower()
+        order = sorted(present, key=sort_value, reverse=direction == "desc") + missing
+        self.orderings[sort_key] = order
+        return order
+
+    def search_bits(self, search: str) -> int:
+        search = search.lower()
+        if search in self.searches:
+            self.searches.move_to_end(search)
+            return self.searches[search]
+        if len(search) >= 3:
+            candidates = self.all_bits
+            for trigram in trigrams(search):
+                candidates &= self.trigram_bits.get(trigram, 0)
+                if not candidates:
+                    return 0
+            indexes = iter_bits(candidates)
+        else:
+            indexes = range(len(self.names))
+        bits = 0
+        for index in indexes:
+            if search in self.names[index]:
+                bits |= 1 << index
+        self.searches[search] = bits
+        if len(self.searches) > 1024:
+            self.searches.popitem(last=False)
+        return bits
+
+    def answer(self, params: list[tuple[str, str]]) -> bytes | None:
+        query = dict(params)
+        if not self.complete or len(query) != len(params) or any(key not in CATALOG_QUERY_PARAMS for key in query):
+            self.counters["fallbacks"] += 1
+            return None
+        try:
+            page = max(int(query.get("page") or 1), 1)
+            limit = max(int(query.get("limit") or CATALOG_DEFAULT_LIMIT), 1)
+        except ValueError:
+            self.counters["fallbacks"] += 1
+            return None
+        order = self.ordering(query.get("sort", ""))
+        if order is None:
+            self.counters["fallbacks"] += 1
+            return None
+
+        bits = self.all_bits
+        for field in ("variant", "category"):
+            value = (query.get(field) or "").lower()
+            if value and value != "all":
+                if not self.field_bits[field]:
+                    self.counters["fallbacks"] += 1
+                    return None
+                bits &= self.field_bits[field].get(value, 0)
+        if query.get("search"):
+            bits &= self.search_bits(query["search"])
+
+        start = (page - 1) * limit
+        if bits == self.all_bits:
+            total = len(self.records)
+            selected = order[start:start + limit]
+        else:
+            total = bits.bit_count()
+            flags = bit_flags(bits)
+            selected = []
+            skipped = 0
+            for index in order:
+                if index < len(flags) and flags[index] == "1":
+                    if skipped < start:
+                        skipped += 1
+                        continue
+                    selected.append(index)
+                    if len(selected) == limit:
+                        break
+
+        self.counters["answered"] += 1
+        return json.dumps(self.render([self.records[index] for index in selected], page, limit, total)).encode()
+
+    def render(self, records: list[dict], page: int, limit: int, total: int):
+        if self.records_key is None:
+            return records
+        document = {**self.envelope, self.records_key: records}
+        pagination = {
+            "page": page,
+            "currentPage": page,
+            "limit": limit,
+            "total": total,
+            "totalItems": total,
+            "count": total,
+            "totalPages": -(-total // limit),
+            "pages": -(-total // limit),
+            "hasMore": page * limit < total,
+            "hasNextPage": page * limit < total,
+        }
+        for container in [document] + [value for value in document.values() if isinstance(value, dict)]:
+            for key, value in pagination.items():
+                if key in container:
+                    container[key] = value
+        return document
+
+    def stats(self) -> dict:
+        return {**self.counters, "items": len(self.records), "complete": self.complete, "sort_keys": sorted(self.orderings)}
+
+ITEM_CATALOG: ItemCatalog | None = None
+CATALOG_SYNC_STATS = {"syncs": 0, "errors": 0, "incomplete": 0, "last_sync_at": None, "last_duration": None}
+
+async def sync_item_catalog():
+    global ITEM_CATALOG
+    started = time.monotonic()
+    records: list[dict] = []
+    envelope: dict = {}
+    records_key = None
+    complete = False
+    for page in range(1, CATALOG_SYNC_MAX_PAGES + 1):
+        query = urlencode({"limit": CATALOG_SYNC_PAGE_SIZE, "page": page})
+        response = await upstream_get(API_BASE_URL, build_api_url("items", query))
+        response.raise_for_status()
+        json_data_obj = load_json(response.content)
+        page_records, records_key = extract_records(json_data_obj)
+        if page == 1 and isinstance(json_data_obj, dict):
+            envelope = {key: value for key, value in json_data_obj.items() if key != records_key}
+        records.extend(record for record in page_records if isinstance(record, dict))
+        has_more = pagination_has_more(json_data_obj, page, len(records))
+        if not page_records or has_more is False:
+            complete = has_more is not True
+            break
+    if not complete:
+        CATALOG_SYNC_STATS["incomplete"] += 1
+    ITEM_CATALOG = await asyncio.to_thread(ItemCatalog, records, envelope, records_key, complete)
+    CATALOG_SYNC_STATS["syncs"] += 1
+    CATALOG_SYNC_STATS["last_sync_at"] = time.time()
+    CATALOG_SYNC_STATS["last_duration"] = round(time.monotonic() - started, 3)
+
+async def run_catalog_sync():
+    while True:
+        try:
+            await sync_item_catalog()
+        except (httpx.HTTPError, json.JSONDecodeError):
+            CATALOG_SYNC_STATS["errors"] += 1
+        await asyncio.sleep(CATALOG_SYNC_INTERVAL)
+
+OG_INDEX: OrderedDict[str, tuple[str, dict | None]] = OrderedDict()
+OG_INDEX_STATS = {"hits": 0, "misses": 0}
+
+def extract_item_og(slug: str, json_data_obj) -> dict | None:
+    if not isinstance(json_data_obj, dict):
+        return None
+    pet_data_root = json_data_obj.get("pet")
+    if not isinstance(pet_data_root, dict):
+        return None
+    target = pet_data_root if pet_data_root.get("slug") == slug else None
+    if isinstance(pet_data_root.get("allVariants"), list):
+        for variant in pet_data_root["allVariants"]:
+            if isinstance(variant, dict) and variant.get("slug") == slug:
+                target = variant
+                break
+    if target is None:
+        target = pet_data_root
+    if not target:
+        return None
+    return {key: target[key] for key in ("name", "description", "image") if key in target}
+
+def lookup_item_og(path: str, response: httpx.Response, json_data_obj=None) -> dict | None:
+    digest = response_digest(response)
+    indexed = OG_INDEX.get(path)
+    if indexed is not None and indexed[0] == digest:
+        OG_INDEX.move_to_end(path)
+        OG_INDEX_STATS["hits"] += 1
+        return indexed[1]
+    OG_INDEX_STATS["misses"] += 1
+    if json_data_obj is None and "application/json" in response.headers.get("content-type", ""):
+        try:
+            json_data_obj = load_json(response.content)
+        except json.JSONDecodeError:
+            pass
+    metadata = extract_item_og(path.split("/")[-1], json_data_obj)
+    OG_INDEX[path] = (digest, metadata)
+    if len(OG_INDEX) > OG_INDEX_MAX_ENTRIES:
+        OG_INDEX.popitem(last=False)
+    return metadata
+
+def is_crawler(request: Request) -> bool:
+    return CRAWLER_USER_AGENTS.search(request.headers.get("user-agent", "")) is not None
+
+CACHE_WARMER_STATS = {"runs": 0, "api_warmed": 0, "images_warmed": 0, "errors": 0, "last_run_at": None, "last_duration": None}
+
+def collect_item_references(json_data_obj, slugs: set[str], image_paths: set[str]):
+    pending = [json_data_obj]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            slug = node.get("slug")
+            if isinstance(slug, str) and slug:
+                slugs.add(slug)
+            image = node.get("image")
+            if isinstance(image, str) and image.startswith("/") and image.lower().endswith(IMAGE_EXTENSIONS):
+                image_paths.add(image.lstrip("/"))
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+
+async def warm_caches_once():
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(CACHE_WARMER_CONCURRENCY)
+    slugs: set[str] = set()
+    image_paths: set[str] = set()
+
+    async def warm_api(path: str):
+        async with semaphore:
+            try:
+                response = await warm_api_response(path)
+                if response.is_success and "application/json" in response.headers.get("content-type", ""):
+                    json_data_obj = load_json(response.content)
+                    collect_item_references(json_data_obj, slugs, image_paths)
+                    if path.startswith("items/"):
+                        lookup_item_og(path, response, json_data_obj)
+                    CACHE_WARMER_STATS["api_warmed"] += 1
+            except (httpx.HTTPError, json.JSONDecodeError):
+                CACHE_WARMER_STATS["errors"] += 1
+
+    async def warm_image(item_path: str):
+        async with semaphore:
+            try:
+                await load_original_image(item_path, f"{IMAGE_BASE_URL}/{item_path}")
+                CACHE_WARMER_STATS["images_warmed"] += 1
+            except (httpx.HTTPError, UnexpectedContentType):
+                CACHE_WARMER_STATS["errors"] += 1
+
+    await asyncio.gather(*(warm_api(path) for path in CACHE_WARMER_LISTS))
+    await asyncio.gather(*(warm_api(f"items/{slug}") for slug in set(slugs)))
+    if IMAGE_CACHE_ENABLED:
+        await asyncio.gather(*(warm_image(item_path) for item_path in image_paths))
+
+    CACHE_WARMER_STATS["runs"] += 1
+    CACHE_WARMER_STATS["last_run_at"] = time.time()
+    CACHE_WARMER_STATS["last_duration"] = round(time.monotonic() - started, 3)
+
+async def run_cache_warmer():
+    while True:
+        try:
+            await warm_caches_once()
+        except Exception:
+            CACHE_WARMER_STATS["errors"] += 1
+        await asyncio.sleep(CACHE_WARMER_INTERVAL)
+
+def collect_component_metrics(registry: MetricsRegistry):
+    for base_url, client in list(UPSTREAM_CLIENTS.items()):
+        pool = describe_upstream_pool(base_url, client)
+        for key in ("connections", "active_connections", "idle_connections", "in_flight_requests"):
+            registry.set("bgsi_upstream_pool", upstream_label(base_url) + (("state", key),), pool[key])
+    for component, counters in (
+        ("api_cache", API_CACHE.counters),
+        ("single_flight", UPSTREAM_FLIGHTS.counters),
+        ("image_cache", IMAGE_CACHE.counters),
+        ("shared_cache", SHARED_CACHE.counters),
+        ("rendered_pages", RENDERED_PAGES.counters),
+        ("negative_cache", NEGATIVE_CACHE.counters),
+        ("delta_resources", DELTA_RESOURCES.counters),
+    ):
+        for event, value in counters.items():
+            registry.set("bgsi_component_events_total", (("component", component), ("event", event)), value)
+    for base_url, guard in list(UPSTREAM_GUARDS.items()):
+        labels = upstream_label(base_url)
+        for event, value in guard.counters.items():
+            registry.set("bgsi_upstream_guard_events_total", labels + (("event", event),), value)
+        registry.set("bgsi_upstream_guard_active", labels, guard.active)
+        registry.set("bgsi_upstream_guard_waiting", labels, len(guard.waiters))
+        registry.set("bgsi_upstream_circuit_open", labels, 0 if guard.state == "closed" else 1 if guard.state == "open" else 0.5)
+    registry.set("bgsi_api_cache_bytes", (), API_CACHE.size)
+    registry.set("bgsi_api_cache_entries", (), len(API_CACHE.entries))
+
+METRICS.describe("bgsi_upstream_pool", "gauge", "Upstream connection pool state, by upstream host.")
+METRICS.describe("bgsi_component_events_total", "counter", "Cache, coalescing and other component counters, by component and event.")
+METRICS.describe("bgsi_upstream_guard_events_total", "counter", "Upstream admission and circuit breaker events, by upstream host and event.")
+METRICS.describe("bgsi_upstream_guard_active", "gauge", "Upstream requests holding a concurrency slot, by upstream host.")
+METRICS.describe("bgsi_upstream_guard_waiting", "gauge", "Upstream requests queued for a concurrency slot, by upstream host.")
+METRICS.describe("bgsi_upstream_circuit_open", "gauge", "Circuit breaker state per upstream host: 0 closed, 0.5 half-open, 1 open.")
+METRICS.describe("bgsi_api_cache_bytes", "gauge", "Bytes held by the in-process API response cache.")
+METRICS.describe("bgsi_api_cache_entries", "gauge", "Entries held by the in-process API response cache.")
+METRICS.collectors.append(collect_component_metrics)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_upstream_client(API_BASE_URL)
+    get_upstream_client(IMAGE_BASE_URL)
+    if IMAGE_CACHE_ENABLED:
+        await asyncio.to_thread(IMAGE_CACHE.open)
+    if SHARED_CACHE_ENABLED:
+        await asyncio.to_thread(SHARED_CACHE.open)
+    if UPSTREAM_WARMUP_CONNECTIONS > 0:
+        await warm_upstream_connections()
+    if CACHE_WARMER_ENABLED:
+        spawn_background_task(run_cache_warmer())
+    if CATALOG_INDEX_ENABLED:
+        spawn_background_task(run_catalog_sync())
+    try:
+        yield
+    finally:
+        for task in list(BACKGROUND_TASKS):
+            task.cancel()
+        await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+        clients = list(UPSTREAM_CLIENTS.values())
+        UPSTREAM_CLIENTS.clear()
+        await asyncio.gather(*(client.aclose() for client in clients))
+        IMAGE_CACHE.close()
+        SHARED_CACHE.close()
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_CONTENT_TYPES = ("text/", "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml")
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    for coding in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+def create_compressor(encoding: str, level: int | None = None):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY if level is None else level)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def compress_bytes(data: bytes, encoding: str, level: int | None = None) -> bytes:
+    compress, _, finish = create_compressor(encoding, level)
+    return compress(data) + finish()
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.lower().startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if passthrough or compressor is not None:
+                if compressor is not None and message["type"] == "http.response.body":
+                    compress, flush, finish = compressor
+                    more_body = message.get("more_body", False)
+                    body = compress(message.get("body", b"")) + (flush() if more_body else finish())
+                    message = {**message, "body": body}
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if (
+                message["type"] != "http.response.body"
+                or start_message["status"] in (204, 206, 304)
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type", ""))
+                or (not more_body and len(body) < self.minimum_size)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressor = create_compressor(encoding)
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                headers["ETag"] = f"W/{headers['etag']}"
+            if "content-length" in headers:
+                del headers["content-length"]
+            compress, flush, finish = compressor
+            if more_body:
+                body = compress(body) + flush()
+            else:
+                body = compress(body) + finish()
+                headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+def metrics_route_label(path: str) -> str:
+    if path == "/":
+        return "/"
+    segments = path.strip("/").split("/")
+    roots = {"api": METRICS_API_ROOTS, "export": METRICS_API_ROOTS, "live": LIVE_PATHS}.get(segments[0])
+    if roots is not None:
+        resource = segments[1:]
+        if segments[0] != "api" and resource[:1] == ["api"]:
+            resource = resource[1:]
+        return f"/{segments[0]}/{resource[0]}" if resource and resource[0] in roots else f"/{segments[0]}/other"
+    if path in ("/batch", "/metrics", "/debug/stats"):
+        return path
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        return "image"
+    return "other"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = metrics_route_label(scope["path"])
+        route_labels = (("route", route),)
+        status_code = 500
+        sent_bytes = 0
+        started = time.perf_counter()
+        METRICS.inc("bgsi_requests_in_flight", route_labels)
+
+        async def send_with_metrics(message):
+            nonlocal status_code, sent_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                sent_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except BaseException as e:
+            METRICS.inc("bgsi_request_errors_total", route_labels + (("error", type(e).__name__),))
+            raise
+        finally:
+            METRICS.inc("bgsi_requests_in_flight", route_labels, -1)
+            METRICS.inc("bgsi_requests_total", route_labels + (("method", scope["method"] if scope["method"] in METRICS_METHODS else "other"), ("status", status_code)))
+            METRICS.observe("bgsi_request_duration_seconds", route_labels, time.perf_counter() - started)
+            METRICS.inc("bgsi_response_bytes_total", route_labels, sent_bytes)
+
+INDEX_HTML_BYTES = INDEX_HTML.encode()
+INDEX_DIGEST = hashlib.blake2b(INDEX_HTML_BYTES, digest_size=16).hexdigest()
+INDEX_HTML_ENCODINGS = {"gzip": compress_bytes(INDEX_HTML_BYTES, "gzip", 9)}
+if brotli is not None:
+    INDEX_HTML_ENCODINGS["br"] = compress_bytes(INDEX_HTML_BYTES, "br", 11)
+
+app = FastAPI(title="BGSI.GG API Explorer & Image Proxy", lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+def generate_api_response_head(page_title: str, og_description: str, og_image_url: str, og_url: str, favicon_url: str) -> str:
     escaped_page_title = html.escape(page_title)
     escaped_og_description = html.escape(og_description)
     escaped_og_image_url = html.escape(og_image_url)
     escaped_og_url = html.escape(og_url)
     escaped_favicon_url = html.escape(favicon_url)
-    escaped_json_data_str = html.escape(json_data_str)
     return f"""
 <!DOCTYPE html>
 <html lang="en">
@@ -463,11 +2613,243 @@ def generate_api_response_html(json_data_str: str, page_title: str, og_descripti
   </style>
 </head>
 <body>
-  <pre>{escaped_json_data_str}</pre>
+  <pre>"""
+
+API_RESPONSE_FOOT = """</pre>
 </body>
 </html>
 """
 
+def generate_api_response_html(json_data_str: str, page_title: str, og_description: str, og_image_url: str, og_url: str, favicon_url: str) -> str:
+    head = generate_api_response_head(page_title, og_description, og_image_url, og_url, favicon_url)
+    return head + html.escape(json_data_str) + API_RESPONSE_FOOT
+
+PAGE_URL_PLACEHOLDER = "\x00page-url\x00"
+PAGE_SITE_PLACEHOLDER = "\x00page-site\x00"
+PAGE_PLACEHOLDERS = re.compile(b"(\x00page-url\x00|\x00page-site\x00)")
+
+class RenderedPageMemo:
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, tuple[list[bytes], int]] = OrderedDict()
+        self.size = 0
+        self.counters = {"hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def get(self, key: str) -> list[bytes] | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry[0]
+
+    def set(self, key: str, rendered: bytes) -> list[bytes]:
+        parts = PAGE_PLACEHOLDERS.split(rendered)
+        if len(rendered) > self.max_bytes:
+            return parts
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+        self.entries[key] = (parts, len(rendered))
+        self.size += len(rendered)
+        self.counters["stores"] += 1
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted[1]
+            self.counters["evictions"] += 1
+        return parts
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self.entries), "bytes": self.size, "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+RENDERED_PAGES = RenderedPageMemo(RENDERED_PAGE_MAX_ENTRIES, RENDERED_PAGE_MAX_BYTES)
+
+async def load_rendered_page(key: str) -> list[bytes] | None:
+    parts = RENDERED_PAGES.get(key)
+    if parts is not None:
+        return parts
+    shared = None if SHARED_CACHE.db is None else await asyncio.to_thread(SHARED_CACHE.get, f"page:{key}")
+    if shared is None:
+        RENDERED_PAGES.counters["misses"] += 1
+        return None
+    RENDERED_PAGES.counters["shared_hits"] += 1
+    return RENDERED_PAGES.set(key, shared["body"])
+
+def store_rendered_page(key: str, rendered: str) -> list[bytes]:
+    rendered_bytes = rendered.encode()
+    if SHARED_CACHE.db is not None:
+        spawn_background_task(asyncio.to_thread(SHARED_CACHE.set, f"page:{key}", 200, [], rendered_bytes, RENDERED_PAGE_SHARED_TTL, 0))
+    return RENDERED_PAGES.set(key, rendered_bytes)
+
+def fill_rendered_page(parts: list[bytes], request: Request) -> bytes:
+    values = {
+        PAGE_URL_PLACEHOLDER.encode(): html.escape(str(request.url)).encode(),
+        PAGE_SITE_PLACEHOLDER.encode(): html.escape(str(request.base_url).rstrip("/")).encode(),
+    }
+    return b"".join(values.get(part, part) for part in parts)
+
+def json_pointer_token(key) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def diff_json(old, new, path: str, patch: list):
+    if type(old) is not type(new):
+        patch.append({"op": "replace", "path": path, "value": new})
+    elif isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": f"{path}/{json_pointer_token(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{json_pointer_token(key)}"
+            if key in old:
+                diff_json(old[key], value, child, patch)
+            else:
+                patch.append({"op": "add", "path": child, "value": value})
+    elif isinstance(new, list):
+        diff_json_list(old, new, path, patch)
+    elif old != new:
+        patch.append({"op": "replace", "path": path, "value": new})
+
+def diff_json_list(old: list, new: list, path: str, patch: list):
+    matcher = difflib.SequenceMatcher(None, [dump_json_bytes(value) for value in old], [dump_json_bytes(value) for value in new], autojunk=False)
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        if tag == "replace" and i2 - i1 == j2 - j1:
+            for offset in range(i2 - i1):
+                diff_json(old[i1 + offset], new[j1 + offset], f"{path}/{i1 + offset}", patch)
+            continue
+        for index in reversed(range(i1, i2)):
+            patch.append({"op": "remove", "path": f"{path}/{index}"})
+        for offset, value in enumerate(new[j1:j2]):
+            patch.append({"op": "add", "path": f"{path}/{i1 + offset}", "value": value})
+
+class DeltaVersions:
+    def __init__(self, versions: int, max_resources: int, max_bytes: int):
+        self.versions = versions
+        self.max_resources = max_resources
+        self.max_bytes = max_bytes
+        self.resources: OrderedDict[str, deque[tuple[str, bytes]]] = OrderedDict()
+        self.patches: OrderedDict[tuple[str, str, str], bytes | None] = OrderedDict()
+        self.size = 0
+        self.counters = {"patches": 0, "patch_hits": 0, "fallbacks": 0, "too_large": 0, "versions": 0, "evictions": 0}
+
+    def record(self, key: str, etag: str, body: bytes):
+        ring = self.resources.get(key)
+        if ring is None:
+            ring = self.resources[key] = deque()
+        else:
+            self.resources.move_to_end(key)
+        if ring and ring[-1][0] == etag:
+            return
+        for version in ring:
+            if version[0] == etag:
+                ring.remove(version)
+                self.size -= len(version[1])
+                break
+        ring.append((etag, body))
+        self.size += len(body)
+        if len(ring) > self.versions:
+            self.size -= len(ring.popleft()[1])
+        self.counters["versions"] += 1
+        self.evict()
+
+    def evict(self):
+        while self.patches and (len(self.patches) > self.max_resources or self.size > self.max_bytes):
+            _, patch = self.patches.popitem(last=False)
+            self.size -= len(patch or b"")
+        while self.resources and (len(self.resources) > self.max_resources or self.size > self.max_bytes):
+            _, ring = self.resources.popitem(last=False)
+            self.size -= sum(len(body) for _, body in ring)
+            self.counters["evictions"] += 1
+
+    def find_base(self, key: str, candidates: set[str]) -> tuple[str, bytes] | None:
+        for version in reversed(self.resources.get(key, ())):
+            if version[0] in candidates:
+                return version
+        return None
+
+    def patch(self, key: str, base: tuple[str, bytes], etag: str, body: bytes) -> bytes | None:
+        patch_key = (key, base[0], etag)
+        if patch_key in self.patches:
+            self.patches.move_to_end(patch_key)
+            self.counters["patch_hits"] += 1
+            return self.patches[patch_key]
+        operations = []
+        try:
+            diff_json(load_json(base[1]), load_json(body), "", operations)
+        except json.JSONDecodeError:
+            patch = None
+        else:
+            patch = dump_json_bytes(operations)
+            if len(patch) >= len(body):
+                self.counters["too_large"] += 1
+                patch = None
+        self.patches[patch_key] = patch
+        self.size += len(patch or b"")
+        self.counters["patches"] += 1
+        self.evict()
+        return patch
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "resources": len(self.resources),
+            "cached_patches": len(self.patches),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "versions_per_resource": self.versions,
+        }
+
+DELTA_RESOURCES = DeltaVersions(DELTA_VERSIONS, DELTA_MAX_RESOURCES, DELTA_MAX_BYTES)
+
+def accepts_json_patch(request: Request) -> bool:
+    return any(token.split(";")[0].strip().lower() == "json-patch" for token in request.headers.get("a-im", "").split(","))
+
+def json_patch_response(request: Request, key: str, response: httpx.Response, headers: dict) -> Response | None:
+    if len(response.content) > DELTA_MAX_BODY_BYTES:
+        return None
+    etag = headers["ETag"]
+    DELTA_RESOURCES.record(key, etag, response.content)
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match or not accepts_json_patch(request):
+        return None
+    base = DELTA_RESOURCES.find_base(key, parse_etag_list(if_none_match))
+    if base is None:
+        DELTA_RESOURCES.counters["fallbacks"] += 1
+        return None
+    patch = DELTA_RESOURCES.patch(key, base, etag, response.content)
+    if patch is None:
+        return None
+    return Response(
+        content=patch,
+        status_code=226,
+        media_type="application/json-patch+json",
+        headers={**headers, "IM": "json-patch", "Delta-Base": base[0], "Cache-Control": "no-store"},
+    )
+
+def stream_api_response_html(head: str, json_data_obj, raw_body: bytes | None = None, encoding: str = "utf-8"):
+    yield head.encode()
+    if raw_body is not None:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        for start in range(0, len(raw_body), STREAMING_RENDER_CHUNK_SIZE):
+            yield html.escape(decoder.decode(raw_body[start:start + STREAMING_RENDER_CHUNK_SIZE])).encode()
+        yield html.escape(decoder.decode(b"", final=True)).encode()
+    else:
+        pending = []
+        pending_size = 0
+        for piece in iter_pretty_json(json_data_obj):
+            pending.append(piece)
+            pending_size += len(piece)
+            if pending_size >= STREAMING_RENDER_CHUNK_SIZE:
+                yield html.escape("".join(pending)).encode()
+                pending = []
+                pending_size = 0
+        if pending:
+            yield html.escape("".join(pending)).encode()
+    yield API_RESPONSE_FOOT.encode()
+
+
 def create_error_html_response(title: str, message: str, status_code: int, details: str = "", guidance_html: str = ""):
     escaped_title = html.escape(title)
     escaped_message = html.escape(message)
@@ -496,90 +2878,447 @@ def create_error_html_response(title: str, message: str, status_code: int, detai
     """
     return HTMLResponse(content=error_page_content, status_code=status_code)
 
+def upstream_unavailable_response(error: UpstreamUnavailable, target_url: str) -> HTMLResponse:
+    response = create_error_html_response(
+        title="Upstream Busy",
+        message=f"The upstream server for {html.escape(target_url)} is overloaded or failing, so the request was not forwarded.",
+        status_code=503,
+        details=error.reason,
+        guidance_html="<div class='guidance'><p>Please try again shortly. Return to the <a href='/'>API Explorer Home Page</a>.</p></div>"
+    )
+    response.headers["Retry-After"] = str(max(1, int(error.retry_after + 0.999)))
+    return response
+
 @app.get("/", response_class=HTMLResponse)
-async def index():
-    return HTMLResponse(content=INDEX_HTML)
+async def index(request: Request):
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding not in INDEX_HTML_ENCODINGS:
+        encoding = None
+    headers = {"ETag": make_etag(INDEX_DIGEST, encoding or ""), "Vary": "Accept-Encoding"}
+    if is_not_modified(request, headers["ETag"], None):
+        return not_modified_response(headers)
+    if encoding is not None:
+        return HTMLResponse(content=INDEX_HTML_ENCODINGS[encoding], headers={**headers, "Content-Encoding": encoding})
+    return HTMLResponse(content=INDEX_HTML_BYTES, headers=headers)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/stats")
+async def debug_stats():
+    return JSONResponse({
+        "upstream_pools": {
+            base_url: describe_upstream_pool(base_url, client)
+            for base_url, client in UPSTREAM_CLIENTS.items()
+        },
+        "api_cache": API_CACHE.stats(),
+        "single_flight": UPSTREAM_FLIGHTS.stats(),
+        "upstream_guards": {base_url: guard.stats() for base_url, guard in UPSTREAM_GUARDS.items()},
+        "image_cache": IMAGE_CACHE.stats(),
+        "shared_cache": SHARED_CACHE.stats(),
+        "cache_warmer": CACHE_WARMER_STATS,
+        "rendered_pages": RENDERED_PAGES.stats(),
+        "negative_cache": NEGATIVE_CACHE.stats(),
+        "delta_resources": DELTA_RESOURCES.stats(),
+        "live_pollers": {key: poller.stats() for key, poller in LIVE_POLLERS.items()},
+        "og_index": {**OG_INDEX_STATS, "entries": len(OG_INDEX)},
+        "item_catalog": {**CATALOG_SYNC_STATS, **(ITEM_CATALOG.stats() if ITEM_CATALOG is not None else {"items": 0})},
+    })
+
+def split_api_path(raw_path: str) -> tuple[str, str]:
+    path, _, query = raw_path.strip().partition("?")
+    path = path.strip("/")
+    if path.startswith("api/"):
+        path = path[len("api/"):]
+    params = [(key, value) for key, value in parse_qsl(query, keep_blank_values=True) if key not in PROXY_QUERY_PARAMS]
+    return path, urlencode(sorted(params))
+
+async def fetch_batch_entry(raw_path: str, semaphore: asyncio.Semaphore) -> dict:
+    path, query = split_api_path(raw_path)
+    entry = {"path": raw_path}
+    started = time.monotonic()
+    try:
+        async with semaphore:
+            response, cache_status = await asyncio.wait_for(fetch_api_response(path, query), BATCH_ITEM_TIMEOUT)
+        entry["status"] = response.status_code
+        entry["cache"] = cache_status
+        if "application/json" in response.headers.get("content-type", ""):
+            try:
+                entry["data"] = load_json(response.content)
+            except json.JSONDecodeError:
+                entry["data"] = response.text
+        else:
+            entry["data"] = response.text
+        if response.is_error:
+            entry["error"] = response.reason_phrase
+    except asyncio.TimeoutError:
+        entry["status"] = 504
+        entry["error"] = f"Timed out after {BATCH_ITEM_TIMEOUT:g}s"
+    except httpx.RequestError as e:
+        entry["status"] = 503
+        entry["error"] = f"Could not connect to API endpoint: {e}"
+    entry["elapsed_ms"] = round((time.monotonic() - started) * 1000, 2)
+    return entry
+
+async def read_batch_paths(request: Request) -> list:
+    if request.method == "GET":
+        return request.query_params.getlist("path")
+    payload = await request.json()
+    return payload.get("paths") if isinstance(payload, dict) else payload
+
+@app.api_route("/batch", methods=["GET", "POST"])
+async def batch(request: Request):
+    try:
+        paths = await read_batch_paths(request)
+    except json.JSONDecodeError:
+        return JSONResponse({"error": "Request body must be JSON: {\"paths\": [\"/api/stats\", ...]}"}, status_code=400)
+    if not isinstance(paths, list) or not paths or not all(isinstance(path, str) and path.strip() for path in paths):
+        return JSONResponse({"error": "Provide a non-empty list of API paths, e.g. {\"paths\": [\"/api/stats\", \"/api/eggs\"]}."}, status_code=400)
+    if len(paths) > BATCH_MAX_PATHS:
+        return JSONResponse({"error": f"At most {BATCH_MAX_PATHS} paths can be requested in one batch."}, status_code=400)
+
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    results = await asyncio.gather(*(fetch_batch_entry(path, semaphore) for path in paths))
+    return JSONResponse({
+        "results": results,
+        "ok": sum(1 for result in results if 200 <= result["status"] < 300),
+        "failed": sum(1 for result in results if not 200 <= result["status"] < 300),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+    })
+
+async def fetch_export_page(path: str, params: list[tuple[str, str]], page: int, page_size: int, offset: int) -> tuple[list, bool | None]:
+    query = urlencode(sorted(params + [("limit", str(page_size)), ("page", str(page))]))
+    response = await coalesced_get(API_BASE_URL, build_api_url(path, query))
+    response.raise_for_status()
+    json_data_obj = load_json(response.content)
+    records = extract_records(json_data_obj)[0]
+    return records, pagination_has_more(json_data_obj, page, offset + len(records))
+
+async def stream_export(path: str, params: list[tuple[str, str]], first_page: int, page_size: int, max_pages: int, first_result: tuple[list, bool | None]):
+    page = first_page
+    exported = 0
+    position = (first_page - 1) * page_size
+    current = asyncio.get_running_loop().create_future()
+    current.set_result(first_result)
+    prefetch = None
+    try:
+        while True:
+            try:
+                records, has_more = await current
+            except httpx.HTTPStatusError as e:
+                yield dump_json_bytes({"_error": f"Upstream returned {e.response.status_code}", "_cursor": page}) + b"\n"
+                return
+            except (httpx.RequestError, json.JSONDecodeError) as e:
+                yield dump_json_bytes({"_error": str(e) or type(e).__name__, "_cursor": page}) + b"\n"
+                return
+            position += len(records)
+            more = bool(records) and has_more is not False
+            has_next = more and page - first_page + 1 < max_pages
+            if has_next:
+                prefetch = asyncio.ensure_future(fetch_export_page(path, params, page + 1, page_size, position))
+            if records:
+                yield b"".join(dump_json_bytes(record) + b"\n" for record in records)
+                exported += len(records)
+            if not has_next:
+                summary = {"_done": not more, "pages": page - first_page + 1, "records": exported}
+                if more:
+                    summary["_cursor"] = page + 1
+                yield dump_json_bytes(summary) + b"\n"
+                return
+            page += 1
+            yield dump_json_bytes({"_cursor": page}) + b"\n"
+            current, prefetch = prefetch, None
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+
+@app.get("/export/{path:path}")
+async def export_api(path: str, request: Request):
+    path = path.strip("/")
+    if path.startswith("api/"):
+        path = path[len("api/"):]
+    params = [(key, value) for key, value in request.query_params.multi_items() if key not in EXPORT_QUERY_PARAMS + PROXY_QUERY_PARAMS]
+    try:
+        first_page = max(int(request.query_params.get("cursor") or request.query_params.get("page") or 1), 1)
+        page_size = min(max(int(request.query_params.get("limit") or EXPORT_PAGE_SIZE), 1), 1000)
+        max_pages = min(max(int(request.query_params.get("max_pages") or EXPORT_MAX_PAGES), 1), EXPORT_MAX_PAGES)
+    except ValueError:
+        return JSONResponse({"error": "cursor, page, limit and max_pages must be integers."}, status_code=400)
+
+    target_url = build_api_url(path, urlencode(sorted(params)))
+    try:
+        first_result = await fetch_export_page(path, params, first_page, page_size, (first_page - 1) * page_size)
+    except httpx.HTTPStatusError as e:
+        return JSONResponse({"error": f"Upstream returned {e.response.status_code} for {target_url}"}, status_code=e.response.status_code)
+    except httpx.RequestError as e:
+        return JSONResponse({"error": f"Could not connect to API endpoint: {target_url}", "details": str(e)}, status_code=503)
+    except json.JSONDecodeError:
+        return JSONResponse({"error": f"Upstream response for {target_url} was not JSON."}, status_code=502)
+
+    return StreamingResponse(
+        stream_export(path, params, first_page, page_size, max_pages, first_result),
+        media_type="application/x-ndjson",
+        headers={"X-Export-Start-Page": str(first_page), "Cache-Control": "no-store"},
+    )
+
+LIVE_RESYNC = object()
+
+class LivePoller:
+    def __init__(self, key: str, path: str, query: str):
+        self.key = key
+        self.path = path
+        self.query = query
+        self.subscribers: set[asyncio.Queue] = set()
+        self.snapshot = None
+        self.snapshot_event: bytes | None = None
+        self.digest: str | None = None
+        self.seen: set = set()
+        self.sequence = 0
+        self.counters = {"polls": 0, "events": 0, "errors": 0, "resyncs": 0}
+        self.task = spawn_background_task(self.run())
+
+    def encode_event(self, event: str, data) -> bytes:
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (self.sequence, event.encode(), dump_json_bytes(data))
+
+    def publish(self, event: str, data):
+        self.sequence += 1
+        self.snapshot_event = None
+        message = self.encode_event(event, data)
+        self.counters["events"] += 1
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait((self.sequence, message))
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((self.sequence, LIVE_RESYNC))
+                self.counters["resyncs"] += 1
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.task.cancel()
+            if LIVE_POLLERS.get(self.key) is self:
+                del LIVE_POLLERS[self.key]
+
+    def current_snapshot_event(self) -> bytes:
+        if self.snapshot_event is None:
+            self.snapshot_event = self.encode_event("snapshot", self.snapshot)
+        return self.snapshot_event
+
+    def record_identity(self, record):
+        if isinstance(record, dict) and record.get("id") is not None:
+            return record["id"]
+        return dump_json_bytes(record)
+
+    def apply(self, data):
+        previous = self.snapshot
+        self.snapshot = data
+        self.snapshot_event = None
+        records, records_key = extract_records(data)
+        identities = {self.record_identity(record) for record in records}
+        if previous is None:
+            self.seen = identities
+            for queue in self.subscribers:
+                if not queue.full():
+                    queue.put_nowait((self.sequence, LIVE_RESYNC))
+            return
+        if records:
+            added = [record for record in records if self.record_identity(record) not in self.seen]
+            self.seen = identities
+            if added:
+                self.publish("records", {"key": records_key, "added": added})
+        elif isinstance(data, dict) and isinstance(previous, dict):
+            changed = {key: value for key, value in data.items() if key not in previous or previous[key] != value}
+            removed = [key for key in previous if key not in data]
+            if changed or removed:
+                self.publish("changes", {"changed": changed, "removed": removed})
+        elif data != previous:
+            self.publish("snapshot", data)
+
+    async def run(self):
+        while True:
+            self.counters["polls"] += 1
+            try:
+                response, _ = await fetch_api_response(self.path, self.query)
+                response.raise_for_status()
+                digest = response_digest(response)
+                if digest != self.digest:
+                    self.apply(load_json(response.content))
+                    self.digest = digest
+            except (httpx.HTTPError, json.JSONDecodeError) as e:
+                self.counters["errors"] += 1
+                self.publish("error", {"error": str(e) or type(e).__name__})
+            await asyncio.sleep(LIVE_POLL_INTERVAL)
+
+    def stats(self) -> dict:
+        return {**self.counters, "subscribers": len(self.subscribers)}
+
+LIVE_POLLERS: dict[str, LivePoller] = {}
+
+async def stream_live_events(poller: LivePoller, queue: asyncio.Queue):
+    synced = -1
+    try:
+        if poller.snapshot is not None:
+            synced = poller.sequence
+            yield poller.current_snapshot_event()
+        while True:
+            try:
+                sequence, message = await asyncio.wait_for(queue.get(), LIVE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if sequence <= synced:
+                continue
+            if message is LIVE_RESYNC:
+                synced = poller.sequence
+                message = poller.current_snapshot_event()
+            yield message
+    finally:
+        poller.unsubscribe(queue)
+
+@app.get("/live/{path:path}")
+async def live_events(path: str, request: Request):
+    path = path.strip("/")
+    if path.startswith("api/"):
+        path = path[len("api/"):]
+    if path.split("/")[0] not in LIVE_PATHS:
+        return JSONResponse({"error": f"Live updates are only available for: {', '.join(LIVE_PATHS)}."}, status_code=404)
+    query = normalize_query(request.query_params)
+    key = f"{path}?{query}"
+    poller = LIVE_POLLERS.get(key)
+    if poller is None:
+        if len(LIVE_POLLERS) >= LIVE_MAX_POLLERS:
+            return JSONResponse({"error": "Too many distinct live feeds are active; try again later."}, status_code=503, headers={"Retry-After": "30"})
+        poller = LIVE_POLLERS[key] = LivePoller(key, path, query)
+    queue = poller.subscribe()
+    return StreamingResponse(
+        stream_live_events(poller, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/api/{path:path}", response_class=HTMLResponse)
 async def proxy_api(path: str, request: Request):
-    query = str(request.query_params)
-    target_url = f"{API_BASE_URL}/api/{path}"
-    if query:
-        target_url += f"?{query}"
-
-    api_headers = {
-        **COMMON_HEADERS,
-        "Accept": "application/json, text/plain, */*",
-        "Referer": f"{API_BASE_URL}/",
-    }
+    query = normalize_query(request.query_params)
+    target_url = build_api_url(path, query)
 
     try:
-        async with httpx.AsyncClient(headers=api_headers, follow_redirects=True) as client:
-            response = await client.get(target_url)
-            response.raise_for_status()
-            
-            json_data_obj = {}
-            pretty_json_str = response.text
-            content_type = response.headers.get("content-type", "")
+        response, cache_status = await fetch_api_response(path, query)
+        response.raise_for_status()
 
-            if "application/json" in content_type:
-                try:
-                    json_data_obj = response.json()
-                    pretty_json_str = json.dumps(json_data_obj, indent=2, sort_keys=True)
-                except json.JSONDecodeError:
-                    pass
-
-            og_page_title = f"{path.replace('/', ' ').title()} - BGSI.GG Data"
-            og_description = f"Live data for {path} from the BGSI.GG API, via API Explorer."
-            og_image_url = f"{str(request.base_url).rstrip('/')}/Logo.png"
-            og_url = str(request.url)
-
-            if path.startswith("items/") and isinstance(json_data_obj, dict):
-                item_slug_from_path = path.split('/')[-1]
-                pet_data_root = json_data_obj.get("pet")
-                target_variant_data_for_og = None
-
-                if isinstance(pet_data_root, dict):
-                    if pet_data_root.get("slug") == item_slug_from_path:
-                        target_variant_data_for_og = pet_data_root
-                    
-                    if isinstance(pet_data_root.get("allVariants"), list):
-                        for variant_in_list in pet_data_root["allVariants"]:
-                            if isinstance(variant_in_list, dict) and variant_in_list.get("slug") == item_slug_from_path:
-                                target_variant_data_for_og = variant_in_list 
-                                break
-                    
-                    if target_variant_data_for_og is None:
-                        target_variant_data_for_og = pet_data_root
-
-                    if target_variant_data_for_og and isinstance(target_variant_data_for_og, dict):
-                        og_page_title = target_variant_data_for_og.get("name", og_page_title)
-                        og_description = target_variant_data_for_og.get("description", f"Details for {og_page_title}.")
-                        pet_image_path_suffix = target_variant_data_for_og.get("image")
-                        if pet_image_path_suffix:
-                            og_image_url = f"{IMAGE_BASE_URL}{pet_image_path_suffix}"
-            
-            elif path == "stats" and isinstance(json_data_obj, dict):
-                og_page_title = "BGSI.GG API Statistics"
-                og_description = "Live global statistics and counts from the BGSI.GG API."
-            
-            html_content = generate_api_response_html(
-                json_data_str=pretty_json_str,
-                page_title=og_page_title,
-                og_description=og_description,
-                og_image_url=og_image_url,
-                og_url=og_url,
-                favicon_url=f"{str(request.base_url).rstrip('/')}/favicon.ico"
+        raw_json = wants_raw_json(request)
+        crawler = not raw_json and is_crawler(request)
+        delta_key = None
+        if raw_json and DELTA_PATHS.fullmatch(path.strip("/")):
+            delta_query = urlencode([(key, value) for key, value in parse_qsl(query, keep_blank_values=True) if key in DELTA_QUERY_PARAMS])
+            delta_key = f"{path.strip('/')}?{delta_query}"
+        validator_headers = {
+            "ETag": make_etag(response_digest(response), "json" if raw_json else "meta" if crawler else "html"),
+            "Last-Modified": response.headers.get("last-modified"),
+            "Vary": "Accept, A-IM" if delta_key else "Accept",
+            "X-Cache": cache_status,
+        }
+        if crawler:
+            validator_headers["Cache-Control"] = "private"
+        if is_not_modified(request, validator_headers["ETag"], validator_headers["Last-Modified"]):
+            return not_modified_response(validator_headers)
+
+        content_type = response.headers.get("content-type", "")
+        response_headers = {name: value for name, value in validator_headers.items() if value is not None}
+        if raw_json:
+            if delta_key:
+                delta_response = json_patch_response(request, delta_key, response, response_headers)
+                if delta_response is not None:
+                    return delta_response
+            return Response(
+                content=response.content,
+                media_type=content_type or "application/json",
+                headers=response_headers,
             )
-            return HTMLResponse(content=html_content)
+
+        memoize = not crawler and len(response.content) < STREAMING_RENDER_THRESHOLD and b"\x00" not in response.content
+        if memoize:
+            page_key = f"{path}:{response_digest(response)}"
+            page_parts = await load_rendered_page(page_key)
+            if page_parts is not None:
+                return HTMLResponse(content=fill_rendered_page(page_parts, request), headers=response_headers)
+
+        json_data_obj = {}
+        is_json = False
+
+        if "application/json" in content_type and not crawler:
+            parse_started = time.perf_counter()
+            try:
+                json_data_obj = load_json(response.content)
+                is_json = True
+            except json.JSONDecodeError:
+                pass
+            METRICS.observe("bgsi_render_duration_seconds", (("phase", "parse"),), time.perf_counter() - parse_started)
+
+        og_page_title = f"{path.replace('/', ' ').title()} - BGSI.GG Data"
+        og_description = f"Live data for {path} from the BGSI.GG API, via API Explorer."
+        site_url = PAGE_SITE_PLACEHOLDER if memoize else str(request.base_url).rstrip('/')
+        og_image_url = f"{site_url}/Logo.png"
+        og_url = PAGE_URL_PLACEHOLDER if memoize else str(request.url)
+
+        if path.startswith("items/"):
+            item_og = lookup_item_og(path, response, None if crawler else json_data_obj)
+            if item_og is not None:
+                og_page_title = item_og.get("name", og_page_title)
+                og_description = item_og.get("description", f"Details for {og_page_title}.")
+                pet_image_path_suffix = item_og.get("image")
+                if pet_image_path_suffix:
+                    og_image_url = f"{IMAGE_BASE_URL}{pet_image_path_suffix}"
+        
+        elif path == "stats" and (crawler or isinstance(json_data_obj, dict)):
+            og_page_title = "BGSI.GG API Statistics"
+            og_description = "Live global statistics and counts from the BGSI.GG API."
+        
+        favicon_url = f"{site_url}/favicon.ico"
+
+        if crawler:
+            head = generate_api_response_head(og_page_title, og_description, og_image_url, og_url, favicon_url)
+            return HTMLResponse(content=f"{head}{html.escape(og_description)}{API_RESPONSE_FOOT}", headers=response_headers)
+
+        if len(response.content) >= STREAMING_RENDER_THRESHOLD:
+            head = generate_api_response_head(og_page_title, og_description, og_image_url, og_url, favicon_url)
+            return StreamingResponse(
+                stream_api_response_html(head, json_data_obj, None if is_json else response.content, response.encoding or "utf-8"),
+                media_type="text/html; charset=utf-8",
+                headers=response_headers,
+            )
+
+        render_started = time.perf_counter()
+        html_content = generate_api_response_html(
+            json_data_str=pretty_json(json_data_obj) if is_json else response.text,
+            page_title=og_page_title,
+            og_description=og_description,
+            og_image_url=og_image_url,
+            og_url=og_url,
+            favicon_url=favicon_url
+        )
+        METRICS.observe("bgsi_render_duration_seconds", (("phase", "render"),), time.perf_counter() - render_started)
+        if memoize:
+            return HTMLResponse(content=fill_rendered_page(store_rendered_page(page_key, html_content), request), headers=response_headers)
+        return HTMLResponse(content=html_content, headers=response_headers)
 
     except httpx.HTTPStatusError as e:
         return create_error_html_response(
             title=f"API Error: {e.response.status_code}",
             message=f"Error fetching API data from: {html.escape(target_url)}.",
             status_code=e.response.status_code,
-            details=f"Reason: {e.response.reason_phrase}\nResponse: {e.response.text}"
+            details=f"Reason: {e.response.reason_phrase}\nResponse: {e.response.text[:ERROR_BODY_MAX_BYTES]}"
         )
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e, target_url)
     except httpx.RequestError as e:
         return create_error_html_response(
             title="API Connection Error",
@@ -593,7 +3332,7 @@ async def proxy_api(path: str, request: Request):
             title="API Response Parsing Error",
             message="Failed to parse JSON response from the API (or it was not JSON).",
             status_code=502,
-            details=f"Error: {e_json.msg if hasattr(e_json, 'msg') else str(e_json)}\n\nRaw Response Text (may be truncated):\n{raw_text[:1000]}"
+            details=f"Error: {e_json.msg if hasattr(e_json, 'msg') else str(e_json)}\n\nRaw Response Text (may be truncated):\n{raw_text[:ERROR_BODY_MAX_BYTES]}"
         )
     except Exception as e:
         return create_error_html_response(
@@ -635,27 +3374,64 @@ async def proxy_image_or_not_found(item_path: str, request: Request):
 
     target_url = f"{IMAGE_BASE_URL}/{item_path}"
     
-    image_headers = {
-        **COMMON_HEADERS,
-        "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
-        "Referer": f"{IMAGE_BASE_URL}/",
-    }
+    try:
+        transform = None if is_favicon or Image is None else parse_image_transform(request.query_params)
+    except ValueError as e:
+        return create_error_html_response(
+            title="Invalid Image Parameters",
+            message=f"The image transformation requested for '/{html.escape(item_path)}' is not valid.",
+            status_code=400,
+            details=str(e)
+        )
 
     try:
-        async with httpx.AsyncClient(headers=image_headers, follow_redirects=True) as client:
-            response = await client.get(target_url)
-            response.raise_for_status()
-            
-            content_type = response.headers.get("content-type", "application/octet-stream")
-            if not is_favicon and not content_type.lower().startswith("image/"):
-                   return create_error_html_response(
-                       title="Invalid Content Type",
-                       message=f"The resource at {html.escape(target_url)} was found but does not appear to be an image.",
-                       status_code=415,
-                       details=f"Expected content type starting with 'image/', but received '{html.escape(content_type)}'."
-                   )
-            return StreamingResponse(io.BytesIO(response.content), media_type=content_type)
+        failure = NEGATIVE_CACHE.get(f"image:{item_path}")
+        if isinstance(failure, httpx.Response):
+            raise_upstream_status(failure)
+        if failure is not None:
+            raise UnexpectedContentType(target_url, failure)
+
+        if transform is not None:
+            transformed = await serve_transformed_image(request, item_path, target_url, transform)
+            if transformed is not None:
+                return transformed
+
+        broadcast = None
+        if IMAGE_CACHE_ENABLED:
+            cached = await asyncio.to_thread(IMAGE_CACHE.lookup, item_path)
+            if cached is not None:
+                try:
+                    broadcast = await revalidate_cached_image(item_path, target_url, cached, is_favicon) if cached["stale"] else None
+                except httpx.RequestError:
+                    broadcast = None
+                if broadcast is None:
+                    return cached_image_response(request, cached)
+
+        if broadcast is None:
+            if "range" in request.headers:
+                return await forward_image_range(request, item_path, target_url, allow_any_content_type=is_favicon)
+            broadcast = await open_image_stream(item_path, target_url, allow_any_content_type=is_favicon)
+        reader = broadcast.subscribe()
+        if reader is None:
+            broadcast = await start_image_stream(item_path, target_url, allow_any_content_type=is_favicon)
+            reader = broadcast.subscribe()
+        response = broadcast.response
+        if is_not_modified(request, response.headers.get("etag"), response.headers.get("last-modified")):
+            broadcast.unsubscribe(reader)
+            return not_modified_response(image_response_headers(response))
+        return StreamingResponse(
+            broadcast.read(reader),
+            media_type=response.headers.get("content-type", "application/octet-stream"),
+            headers={**image_response_headers(response), "accept-ranges": "bytes"},
+        )
 
+    except UnexpectedContentType as e:
+        return create_error_html_response(
+            title="Invalid Content Type",
+            message=f"The resource at {html.escape(target_url)} was found but does not appear to be an image.",
+            status_code=415,
+            details=f"Expected content type starting with 'image/', but received '{html.escape(e.content_type)}'."
+        )
     except httpx.HTTPStatusError as e:
         error_guidance = f"""
         <div class="guidance">
@@ -671,9 +3447,11 @@ async def proxy_image_or_not_found(item_path: str, request: Request):
             title=f"Fetch Error: {e.response.status_code}",
             message=f"Could not retrieve resource from: {html.escape(target_url)}.",
             status_code=e.response.status_code,
-            details=f"Reason: {e.response.reason_phrase}\nUpstream Response: {e.response.text}",
+            details=f"Reason: {e.response.reason_phrase}\nUpstream Response: {e.response.text[:ERROR_BODY_MAX_BYTES]}",
             guidance_html=error_guidance
         )
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e, target_url)
     except httpx.RequestError as e:
         return create_error_html_response(
             title="Connection Error",